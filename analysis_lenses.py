@@ -0,0 +1,42 @@
+import os
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rounds of generation a lens gets before the report goes out without its section
+ANALYSIS_LENS_ATTEMPTS = int(os.getenv("ANALYSIS_LENS_ATTEMPTS", "2"))
+
+# (key, title, prompt) for each section of a multi-lens report, in report order
+ANALYSIS_LENSES = [
+    ("engagement", "Audience Engagement",
+     "Analyze this video advertisement for audience engagement only: the hook in the first seconds, pacing, "
+     "attention drop-off risks, emotional appeal, the target audience it speaks to, and the call to action."),
+    ("messaging", "Messaging & Storytelling",
+     "Analyze this video advertisement for messaging and storytelling only: the key messages, narrative structure, "
+     "clarity of the value proposition, and how well the story supports the offer."),
+    ("visual_audio", "Visual & Audio Elements",
+     "Analyze this video advertisement for visual and audio elements only: composition, color, on-screen text, "
+     "editing, music, voice-over, sound design, and whether the ad works with the sound off."),
+    ("brand", "Brand Consistency",
+     "Analyze this video advertisement for brand consistency only: logo and product visibility, when the brand "
+     "first appears, tone of voice, and how consistently the brand identity is carried through."),
+    ("platform", "Platform Optimization",
+     "Analyze this video advertisement for platform optimization only: aspect ratio, length, captions, and which "
+     "platforms and placements it suits, with concrete changes for the ones it doesn't."),
+]
+
+LENS_TITLES = {key: title for key, title, _ in ANALYSIS_LENSES}
+
+def lens_prompt(lens_prompt_text, prompt=''):
+    instructions = f"{lens_prompt_text} Give specific, timestamped observations and end with areas for improvement."
+    return f"{instructions}\n\nAdditional instructions: {prompt}" if prompt else instructions
+
+def merge_report(sections):
+    # `sections` maps lens key to text; a missing key is a lens that failed
+    parts = ["# Video Ad Analysis"]
+    for key, title, _ in ANALYSIS_LENSES:
+        text = sections.get(key)
+        parts.append(f"## {title}\n\n{text.strip() if text else '_This section could not be generated._'}")
+    return "\n\n".join(parts)
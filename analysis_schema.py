@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import logging
+from analysis_lenses import ANALYSIS_LENSES
+from resilience import MalformedResponseError
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Longest summary stored for the history list (characters)
+ANALYSIS_SUMMARY_MAX_CHARS = int(os.getenv("ANALYSIS_SUMMARY_MAX_CHARS", "280"))
+
+# Output budget for schema-constrained analyses; the JSON wraps a full written analysis
+ANALYSIS_MAX_OUTPUT_TOKENS = int(os.getenv("ANALYSIS_MAX_OUTPUT_TOKENS", "8192"))
+
+# Generations per structured analysis before a malformed response fails it
+ANALYSIS_ATTEMPTS = int(os.getenv("ANALYSIS_ATTEMPTS", "2"))
+
+# One 1-10 score per report lens
+SCORE_KEYS = [key for key, _, _ in ANALYSIS_LENSES]
+
+# Response schema for video analyses (the OpenAPI subset Gemini accepts)
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "summary": {"type": "STRING", "description": "Two or three sentence verdict on the ad"},
+        "overall_score": {"type": "INTEGER", "description": "Overall effectiveness from 1 to 10"},
+        "scores": {
+            "type": "OBJECT",
+            "properties": {key: {"type": "INTEGER", "description": f"{title} from 1 to 10"} for key, title, _ in ANALYSIS_LENSES},
+            "required": SCORE_KEYS,
+        },
+        "target_audience": {"type": "STRING"},
+        "key_messages": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "strengths": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "recommendations": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "analysis": {"type": "STRING", "description": "The written analysis in at most 600 words, with timestamps where relevant"},
+    },
+    "required": ["summary", "overall_score", "scores", "target_audience", "key_messages", "recommendations", "analysis"],
+}
+
+STRUCTURED_OUTPUT_CONFIG = {"response_mime_type": "application/json", "response_schema": ANALYSIS_SCHEMA}
+
+# Typed video_analysis_output columns filled from a structured analysis
+ANALYSIS_DETAIL_COLUMNS = ["summary", "overall_score", "scores", "target_audience", "key_messages", "strengths", "recommendations"]
+
+def score(value):
+    try:
+        return max(1, min(10, int(value)))
+    except (TypeError, ValueError):
+        return None
+
+def string_list(value):
+    return [str(item) for item in value] if isinstance(value, list) else []
+
+def parse_analysis(text):
+    # The model's JSON as a normalized dict, or None if it isn't usable (e.g. truncated at the token limit)
+    try:
+        data = json.loads(re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip()))
+    except (TypeError, ValueError):
+        logger.warning("Video analysis is not valid JSON")
+        return None
+    if not isinstance(data, dict) or not data.get("summary"):
+        logger.warning("Video analysis JSON is missing its summary")
+        return None
+    scores = data.get("scores") if isinstance(data.get("scores"), dict) else {}
+    return {
+        "summary": str(data["summary"]),
+        "overall_score": score(data.get("overall_score")),
+        "scores": {key: score(scores.get(key)) for key in SCORE_KEYS},
+        "target_audience": str(data.get("target_audience") or ""),
+        "key_messages": string_list(data.get("key_messages")),
+        "strengths": string_list(data.get("strengths")),
+        "recommendations": string_list(data.get("recommendations")),
+        "analysis": str(data.get("analysis") or ""),
+    }
+
+def render_analysis(data):
+    # Markdown shown in the chat and kept in the `analysis` column for follow-up questions
+    titles = {key: title for key, title, _ in ANALYSIS_LENSES}
+    parts = [data["summary"]]
+    if data["overall_score"] is not None:
+        parts.append(f"**Overall score:** {data['overall_score']}/10")
+    scores = [f"- {titles[key]}: {value}/10" for key, value in data["scores"].items() if value is not None]
+    if scores:
+        parts.append("**Scores**\n" + "\n".join(scores))
+    if data["target_audience"]:
+        parts.append(f"**Target audience:** {data['target_audience']}")
+    for title, items in (("Key messages", data["key_messages"]), ("Strengths", data["strengths"]),
+                         ("Recommendations", data["recommendations"])):
+        if items:
+            parts.append(f"**{title}**\n" + "\n".join(f"- {item}" for item in items))
+    if data["analysis"]:
+        parts.append(data["analysis"])
+    return "\n\n".join(parts)
+
+def summarize(text, max_chars=ANALYSIS_SUMMARY_MAX_CHARS):
+    # Fallback summary for prose analyses: the first paragraph that isn't a heading, cut at a word boundary
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip() and not p.strip().startswith("#")]
+    summary = re.sub(r"\s+", " ", paragraphs[0] if paragraphs else text).strip()
+    if len(summary) > max_chars:
+        summary = summary[:max_chars].rsplit(" ", 1)[0] + "…"
+    return summary
+
+def analysis_record(text, structured=True):
+    # (analysis text, typed columns) for video_analysis_output; raw JSON is never stored as the analysis
+    if not structured:
+        return text, {"summary": summarize(text)}
+    data = parse_analysis(text)
+    if data is None:
+        raise MalformedResponseError("The analysis came back incomplete, please try again")
+    return render_analysis(data), {
+        "summary": summarize(data["summary"]),
+        "overall_score": data["overall_score"],
+        "scores": data["scores"],
+        "target_audience": data["target_audience"] or None,
+        "key_messages": data["key_messages"],
+        "strengths": data["strengths"],
+        "recommendations": data["recommendations"],
+    }
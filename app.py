@@ -1,17 +1,36 @@
 import os
 from fastapi import FastAPI, File, Form, UploadFile, Depends, HTTPException, status, BackgroundTasks
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.requests import Request
+from starlette.background import BackgroundTask
 from chatbot import Chatbot
-from database import create_user, get_user_by_email, async_insert_chat_message, get_chat_history, insert_video_analysis, get_video_analysis_history, check_user_exists
+from response_cache import ResponseCache, SegmentCache, normalize_prompt
+from singleflight import SingleFlight
+from upload_pipeline import UploadPipeline, should_pipeline, upload_mime_type
+from segmented_analysis import should_segment, segmenting_unavailable
+from analysis_schema import analysis_record, summarize, ANALYSIS_DETAIL_COLUMNS
+from analysis_lenses import ANALYSIS_LENSES
+from video_probe import probe_video, sniff, video_duration, video_format
+from uploads import UploadRejected, check_declared_size, check_content_type, save_upload, save_stream
+from temp_storage import TempStorage, UPLOAD_REAP_INTERVAL
+from resumable_uploads import ResumableUploads, OffsetMismatch
+from video_dedupe import VideoIndex, prompt_hash
+from job_queue import JobQueue, JOB_COMPLETED, JOB_FAILED
+from scheduler import SchedulerSaturated
+from resilience import GeminiError
+from history_manager import HISTORY_REHYDRATE_LIMIT, SUMMARY_CHAT_TYPE
+from database import create_user, get_user_by_email, async_insert_chat_message, get_chat_history, insert_video_analysis, get_video_analysis_history, get_video_analysis, check_user_exists
+from file_registry import FileRegistry
 from dotenv import load_dotenv
 import uvicorn
 from supabase.client import create_client, Client
 import uuid
 import json
+import hashlib
+import secrets
 from redis_config import get_redis_client, test_redis_connection, CHAT_SESSION_TTL
 import redis
 import logging
@@ -23,7 +42,9 @@ from fastapi_utils.tasks import repeat_every
 load_dotenv()
 
 app = FastAPI()
-chatbot = Chatbot()
+chatbot = Chatbot(response_cache=ResponseCache(), file_registry=FileRegistry(), segment_cache=SegmentCache())
+singleflight = SingleFlight()
+temp_storage = TempStorage()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,6 +64,9 @@ if not supabase_url or not supabase_key:
 
 supabase: Client = create_client(supabase_url, supabase_key)
 
+# Bearer token for /metrics; without one, /metrics only answers requests from this host
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 redis_client = None
 
 @app.on_event("startup")
@@ -60,6 +84,47 @@ async def startup_event():
             logger.warning("Failed to initialize Redis client")
     except Exception as e:
         logger.error(f"Error during Redis initialization: {str(e)}")
+    video_jobs.start()
+
+@app.on_event("startup")
+@repeat_every(seconds=UPLOAD_REAP_INTERVAL, logger=logger)
+async def reap_temp_files():
+    # Uploads whose job never cleaned up (crashes, lost jobs) and abandoned resumable uploads are deleted by age
+    await temp_storage.reap()
+    await resumable_uploads.reap()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await video_jobs.stop()
+
+@app.exception_handler(SchedulerSaturated)
+async def scheduler_saturated_handler(request: Request, exc: SchedulerSaturated):
+    return JSONResponse(
+        {"detail": "The assistant is busy, please try again shortly."},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(UploadRejected)
+async def upload_rejected_handler(request: Request, exc: UploadRejected):
+    return JSONResponse({"detail": str(exc)}, status_code=exc.status_code)
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Turn away oversized uploads before the body is read. Multipart bodies are spooled to disk whole before
+    # any handler runs, so one sent without a Content-Length (chunked) could exceed MAX_UPLOAD_SIZE unchecked
+    multipart = request.headers.get("content-type", "").lower().startswith("multipart/form-data")
+    if request.method == "POST" and (multipart or request.url.path == "/videos"):
+        try:
+            check_declared_size(request.headers.get("content-length"), required=multipart)
+        except UploadRejected as exc:
+            return JSONResponse({"detail": str(exc)}, status_code=exc.status_code)
+    return await call_next(request)
+
+@app.exception_handler(GeminiError)
+async def gemini_error_handler(request: Request, exc: GeminiError):
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+    return JSONResponse({"detail": str(exc)}, status_code=exc.status_code, headers=headers)
 
 def get_current_user(request: Request):
     user = request.session.get('user')
@@ -148,43 +213,472 @@ async def send_message(
     request: Request,
     message: str = Form(""),
     video: UploadFile = File(None),
+    no_cache: bool = Form(False),
+    deep_analysis: bool = Form(False),
+    force_reanalyze: bool = Form(False),
+    segmented: bool = Form(False),
+    multi_lens: bool = Form(False),
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     current_user = get_current_user(request)
     user_id = uuid.UUID(current_user['id'])
     
-    if not check_user_exists(user_id):
+    if not await asyncio.to_thread(check_user_exists, user_id):
         raise HTTPException(status_code=400, detail="User does not exist")
     
     if video:
-        video_path = os.path.join('temp', video.filename)
-        os.makedirs('temp', exist_ok=True)
-        with open(video_path, "wb") as buffer:
-            content = await video.read()
-            buffer.write(content)
-        
-        analysis_result = chatbot.analyze_video(video_path, message)
-        os.remove(video_path)
-        
-        await insert_video_analysis(user_id, video.filename, analysis_result)
-        return {"response": analysis_result}
+        # The upload is kept on disk until its analysis job finishes; any failure before that removes it
+        content_length = request.headers.get("content-length", "")
+        async with temp_storage.spool(video.filename, int(content_length) if content_length.isdigit() else None) as video_path:
+            # Streamed to disk in chunks and hashed on the way, never held in memory whole
+            _, video_hash = await save_upload(video, video_path, check_head=sniff)
+            return await start_video_analysis(
+                user_id, video_path, video.filename, video_hash, message, deep_analysis, no_cache, force_reanalyze, segmented,
+                multi_lens,
+            )
     else:
-        # Process the message with the chatbot
-        response = chatbot.send_message(message)
+        # Rehydrate the user's chat session from stored history if it is not pooled
+        history = None
+        if user_id not in chatbot.sessions:
+            history = await get_chat_history(user_id, HISTORY_REHYDRATE_LIMIT)
+
+        # Duplicate submissions of the same message and options share one chatbot call and one stored turn
+        response = await singleflight.do(
+            flight_key("chat", user_id, f"{deep_analysis}:{no_cache}:{message}"),
+            lambda: process_chat_message(user_id, message, history, not no_cache, deep_analysis),
+        )
         
-        # Add the user message and bot response to the chat history
-        await async_insert_chat_message(user_id, message, 'text')
-        await async_insert_chat_message(user_id, response, 'bot')
+        # Keep the conversation window under its token budget without delaying the reply
+        background_tasks.add_task(compact_chat_history, user_id)
         
         return {"response": response}
 
+@app.post("/videos")
+async def upload_video_raw(
+    request: Request,
+    file_name: str = None,
+    message: str = "",
+    no_cache: bool = False,
+    deep_analysis: bool = False,
+    force_reanalyze: bool = False,
+    segmented: bool = False,
+    multi_lens: bool = False,
+):
+    # The body is the raw video (application/octet-stream); options come in the query string.
+    # Skips multipart parsing and streams straight to the temp store.
+    current_user = get_current_user(request)
+    user_id = uuid.UUID(current_user['id'])
+    check_content_type(request.headers.get("content-type"))
+    file_name = file_name or request.headers.get("x-file-name") or "upload.mp4"
+
+    content_length = request.headers.get("content-length", "")
+    size = int(content_length) if content_length.isdigit() else None
+    async with temp_storage.spool(file_name, size) as video_path:
+        if should_pipeline(size):
+            # Forward to Gemini while the body is still arriving; the job then finds the file in the registry
+            pipeline = UploadPipeline(
+                chatbot.backend, size, upload_mime_type(request.headers.get("content-type"), file_name), file_name,
+                resilience=chatbot.resilience,
+            )
+            try:
+                _, video_hash = await save_stream(pipeline.tee(request.stream()), video_path, check_head=sniff)
+            except BaseException:
+                pipeline.cancel()
+                raise
+            remote_file = await pipeline.result()
+            if remote_file is not None:
+                await chatbot.file_registry.put(user_id, video_hash, remote_file)
+        else:
+            _, video_hash = await save_stream(request.stream(), video_path, check_head=sniff)
+        return await start_video_analysis(
+            user_id, video_path, file_name, video_hash, message, deep_analysis, no_cache, force_reanalyze, segmented,
+            multi_lens,
+        )
+
+async def start_video_analysis(user_id, video_path, file_name, video_hash, message, deep, no_cache, force_reanalyze,
+                               segmented=False, multi_lens=False):
+    # Takes ownership of the stored upload at `video_path`
+    # Reject corrupt, unsupported or over-long videos from their headers before paying for an upload
+    info = await asyncio.to_thread(probe_video, video_path)
+    # Long videos are split into segments analyzed in parallel, unless the user asked for a lens report instead.
+    # Segmenting asked for explicitly takes precedence over a lens report.
+    notice = segmenting_unavailable(info.get("duration")) if segmented else None
+    if segmented or not multi_lens:
+        segmented = should_segment(info.get("duration"), segmented)
+    if segmented and multi_lens:
+        notice = "The video was analyzed in segments, so the report has no per-lens sections."
+        multi_lens = False
+    analysis_prompt_hash = prompt_hash(
+        message, deep, chatbot.router.model_name("deep_analysis" if deep else "video"), "lenses" if multi_lens else None
+    )
+
+    # The same bytes with the same prompt were analyzed before: serve that result right away
+    if not force_reanalyze:
+        previous = await video_index.lookup(video_hash, analysis_prompt_hash)
+        if previous:
+            # Rows from before structured output have no summary of their own
+            details = {column: previous.get(column) for column in ANALYSIS_DETAIL_COLUMNS}
+            details["summary"] = details["summary"] or summarize(previous["analysis"])
+            await insert_video_analysis(
+                user_id, file_name, previous["analysis"], video_duration(info), video_format(info),
+                content_hash=video_hash, prompt_hash=analysis_prompt_hash,
+                processing_seconds=previous.get("processing_seconds"), details=details, deduplicated=True,
+            )
+            if await chatbot.file_registry.get(user_id, video_hash) is not None:
+                # Follow-up questions can use the Gemini file already uploaded for these bytes
+                await asyncio.to_thread(temp_storage.remove, video_path)
+                await video_index.saved(previous)
+            else:
+                # Nobody's upload of these bytes is left for follow-up questions; the upload owns the file now.
+                # That costs an upload and processing wait, so the hit doesn't count as saved processing.
+                keep_video_later(user_id, video_path, video_hash)
+            return {"response": previous["analysis"], "deduplicated": True}
+
+    job = await video_jobs.submit(user_id, {
+        "video_path": video_path,
+        "file_name": file_name,
+        "prompt": message,
+        "video_hash": video_hash,
+        "prompt_hash": analysis_prompt_hash,
+        "use_cache": not (no_cache or force_reanalyze),
+        "deep": deep,
+        "video_duration": video_duration(info),
+        "video_format": video_format(info),
+        "duration": info.get("duration"),
+        "segmented": segmented,
+        "multi_lens": multi_lens,
+        "notice": notice,
+    })
+    return JSONResponse(job_view(job), status_code=202)
+
+# Progress callbacks of the jobs sharing each in-flight lens report in this worker, keyed by flight
+lens_watchers = {}
+
+async def run_video_job(job, progress):
+    params = job["params"]
+    user_id = uuid.UUID(job["user_id"])
+    started = time.monotonic()
+    # The upload is removed when the job ends, unless it is requeued or handed on for follow-up questions
+    keep_upload = False
+    # Identical uploads with the same prompt share one analysis, even across users
+    key = flight_key(
+        "video", params["video_hash"],
+        f"{params['deep']}:{params.get('segmented')}:{params.get('multi_lens')}:{params['prompt']}",
+    )
+    try:
+        if params.get("segmented"):
+            analyze = lambda: chatbot.analyze_video_segmented(
+                params["video_path"], params["duration"], params["prompt"], params["video_hash"],
+                prompt_key=params["prompt_hash"], use_cache=params["use_cache"], user_id=user_id, deep=params["deep"],
+                progress=progress,
+            )
+        elif params.get("multi_lens"):
+            # Sections are published as they finish, on this job and every job that joined its report, so the
+            # client can show them before the report
+            sections = []
+            lens_watchers.setdefault(key, set()).add(progress)
+
+            async def on_section(lens, title, text):
+                sections.append({"key": lens, "title": title, "text": text})
+
+            async def lens_progress(stage, fraction):
+                # The chatbot reports progress right after each section, so one write carries both
+                for watcher in list(lens_watchers.get(key, ())):
+                    await watcher(stage, fraction, sections=sections)
+
+            async def analyze():
+                report = await chatbot.analyze_video_lenses(
+                    params["video_path"], params["prompt"], params["video_hash"], use_cache=params["use_cache"],
+                    user_id=user_id, deep=params["deep"], progress=lens_progress, on_section=on_section,
+                )
+                return {"report": report, "sections": sections, "prompt_hash": params.get("prompt_hash")}
+        else:
+            analyze = lambda: chatbot.analyze_video(
+                params["video_path"], params["prompt"], params["video_hash"], use_cache=params["use_cache"],
+                user_id=user_id, deep=params["deep"], progress=progress,
+            )
+        analysis_result = await singleflight.do(key, analyze)
+        analysis_prompt_hash = params.get("prompt_hash")
+        partial = False
+        if params.get("multi_lens"):
+            # A job that joined another's report stores it as that job would, with its sections and prompt hash
+            sections, analysis_prompt_hash = analysis_result["sections"], analysis_result["prompt_hash"]
+            analysis_result = analysis_result["report"]
+            await progress("saving", 0.95, sections=sections)
+            # A lens report missing sections is kept for this user but never served to later uploads of the video
+            partial = len(sections) < len(ANALYSIS_LENSES)
+        # Single and segmented analyses come back as schema-constrained JSON; lens reports are prose
+        analysis_result, details = analysis_record(analysis_result, structured=not params.get("multi_lens"))
+        await insert_video_analysis(
+            user_id, params["file_name"], analysis_result, params.get("video_duration"), params.get("video_format"),
+            content_hash=params["video_hash"], prompt_hash=None if partial else analysis_prompt_hash,
+            processing_seconds=time.monotonic() - started, details=details,
+        )
+        # Cached and segmented analyses never upload the whole video for this user. That happens after the job
+        # completes, so the result isn't held back by it and a shutdown can't requeue an already stored analysis
+        keep_video_later(user_id, params["video_path"], params["video_hash"])
+        keep_upload = True
+    except asyncio.CancelledError:
+        # The job is requeued on shutdown and needs its upload again
+        keep_upload = True
+        raise
+    except SchedulerSaturated:
+        # Deferred while Gemini is saturated, unless it is out of attempts and fails for good
+        keep_upload = video_jobs.will_defer(job)
+        raise
+    finally:
+        if params.get("multi_lens"):
+            lens_watchers[key].discard(progress)
+            if not lens_watchers[key]:
+                del lens_watchers[key]
+        if not keep_upload:
+            await asyncio.to_thread(temp_storage.remove, params["video_path"])
+    return analysis_result
+
+# Uploads of analyzed videos still being kept for follow-up questions
+keep_video_tasks = set()
+
+def keep_video_later(user_id, video_path, video_hash):
+    async def keep():
+        try:
+            await chatbot.keep_video(video_path, video_hash, user_id)
+        finally:
+            await asyncio.to_thread(temp_storage.remove, video_path)
+
+    task = asyncio.get_running_loop().create_task(keep())
+    keep_video_tasks.add(task)
+    task.add_done_callback(keep_video_tasks.discard)
+
+video_jobs = JobQueue(run_video_job)
+video_index = VideoIndex()
+
+def upload_pipeline(upload):
+    # Large resumable uploads are forwarded to Gemini chunk by chunk, as /videos does with its stream
+    if not should_pipeline(upload["size"]):
+        return None
+    return UploadPipeline(
+        chatbot.backend, upload["size"], upload_mime_type(upload.get("content_type"), upload["file_name"]),
+        upload["file_name"], resilience=chatbot.resilience,
+    )
+
+resumable_uploads = ResumableUploads(temp_storage, pipeline=upload_pipeline)
+
+def job_view(job):
+    view = {
+        "job_id": job["id"],
+        "state": job["state"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "file_name": job["params"]["file_name"],
+    }
+    if job["params"].get("notice"):
+        view["notice"] = job["params"]["notice"]
+    if job.get("sections"):
+        view["sections"] = job["sections"]
+    if job["state"] == JOB_COMPLETED:
+        view["response"] = job["result"]
+    elif job["state"] == JOB_FAILED:
+        view["detail"] = job["error"]
+        view["status_code"] = job["status_code"]
+    return view
+
+@app.post("/uploads", status_code=201)
+async def create_upload(
+    request: Request,
+    file_name: str = Form(...),
+    size: int = Form(...),
+    content_type: str = Form(None),
+    message: str = Form(""),
+    no_cache: bool = Form(False),
+    deep_analysis: bool = Form(False),
+    force_reanalyze: bool = Form(False),
+    segmented: bool = Form(False),
+    multi_lens: bool = Form(False),
+):
+    current_user = get_current_user(request)
+    user_id = uuid.UUID(current_user['id'])
+    upload = await resumable_uploads.create(user_id, file_name, size, content_type, {
+        "message": message,
+        "no_cache": no_cache,
+        "deep_analysis": deep_analysis,
+        "force_reanalyze": force_reanalyze,
+        "segmented": segmented,
+        "multi_lens": multi_lens,
+    })
+    return {"upload_id": upload["id"], "offset": 0, "size": size}
+
+async def get_upload(request, upload_id):
+    current_user = get_current_user(request)
+    upload = await resumable_uploads.get(upload_id, uuid.UUID(current_user['id']))
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(request: Request, upload_id: str):
+    upload = await get_upload(request, upload_id)
+    offset = await resumable_uploads.offset(upload)
+    return JSONResponse({"upload_id": upload_id, "offset": offset, "size": upload["size"]}, headers={"Upload-Offset": str(offset)})
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(request: Request, upload_id: str):
+    # The body is the chunk; Upload-Offset says where it starts
+    upload = await get_upload(request, upload_id)
+    try:
+        offset = int(request.headers["upload-offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Missing or invalid Upload-Offset header")
+    try:
+        offset = await resumable_uploads.append(upload, offset, request.stream())
+    except OffsetMismatch as exc:
+        return JSONResponse(
+            {"detail": str(exc), "offset": exc.offset}, status_code=exc.status_code, headers={"Upload-Offset": str(exc.offset)}
+        )
+    return JSONResponse({"upload_id": upload_id, "offset": offset, "size": upload["size"]}, headers={"Upload-Offset": str(offset)})
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(request: Request, upload_id: str):
+    upload = await get_upload(request, upload_id)
+    video_path, video_hash, remote_file = await resumable_uploads.finalize(upload)
+    params = upload["params"]
+    try:
+        if remote_file is not None:
+            await chatbot.file_registry.put(uuid.UUID(upload["user_id"]), video_hash, remote_file)
+        return await start_video_analysis(
+            uuid.UUID(upload["user_id"]), video_path, upload["file_name"], video_hash, params["message"],
+            params["deep_analysis"], params["no_cache"], params["force_reanalyze"], params.get("segmented", False),
+            params.get("multi_lens", False),
+        )
+    except BaseException:
+        await asyncio.to_thread(temp_storage.remove, video_path)
+        raise
+
+@app.delete("/uploads/{upload_id}")
+async def abort_upload(request: Request, upload_id: str):
+    upload = await get_upload(request, upload_id)
+    await resumable_uploads.abort(upload)
+    return {"upload_id": upload_id, "aborted": True}
+
+@app.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str):
+    current_user = get_current_user(request)
+    job = await video_jobs.get(job_id)
+    if job is None or job["user_id"] != str(uuid.UUID(current_user['id'])):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+def flight_key(kind, scope, prompt):
+    return f"{kind}:{scope}:{hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()}"
+
+async def process_chat_message(user_id, message, history, use_cache, deep):
+    # Process the message with the chatbot
+    response = await chatbot.send_message(user_id, message, history, use_cache=use_cache, deep=deep)
+    
+    # Add the user message and bot response to the chat history
+    await async_insert_chat_message(user_id, message, 'text')
+    await async_insert_chat_message(user_id, response, 'bot')
+    return response
+
+async def compact_chat_history(user_id):
+    summary = await chatbot.compact_history(user_id)
+    if summary:
+        await async_insert_chat_message(user_id, summary, SUMMARY_CHAT_TYPE)
+
+def sse_event(data, event=None):
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+@app.post("/send_message_stream")
+async def send_message_stream(
+    request: Request,
+    message: str = Form(...),
+    no_cache: bool = Form(False),
+    deep_analysis: bool = Form(False),
+):
+    current_user = get_current_user(request)
+    user_id = uuid.UUID(current_user['id'])
+    
+    if not await asyncio.to_thread(check_user_exists, user_id):
+        raise HTTPException(status_code=400, detail="User does not exist")
+    
+    history = None
+    if user_id not in chatbot.sessions:
+        history = await get_chat_history(user_id, HISTORY_REHYDRATE_LIMIT)
+
+    # Shared with /send_message, so a streamed request can join a plain one with the same options
+    key = flight_key("chat", user_id, f"{deep_analysis}:{no_cache}:{message}")
+    # Turn the request away up front; once streaming starts the status code is already sent
+    chatbot.scheduler.admit(user_id)
+
+    async def event_stream():
+        future = singleflight.join(key)
+        if future is not None:
+            # Same message is already being answered; send its result once it is ready
+            try:
+                response = await asyncio.shield(future)
+            except Exception:
+                yield sse_event({"message": "I apologize, but there was an error processing your request. Please try again."}, "error")
+                return
+            yield sse_event({"text": response})
+            yield sse_event({"response": response}, "done")
+            return
+
+        flight = singleflight.begin(key)
+        chunks = []
+        try:
+            async for text in chatbot.stream_message(user_id, message, history, use_cache=not no_cache, deep=deep_analysis):
+                chunks.append(text)
+                yield sse_event({"text": text})
+
+            # Persist the complete exchange once the stream has finished
+            response = "".join(chunks)
+            await async_insert_chat_message(user_id, message, 'text')
+            await async_insert_chat_message(user_id, response, 'bot')
+            singleflight.finish(key, flight, response)
+        except SchedulerSaturated as e:
+            singleflight.finish(key, flight, error=e)
+            yield sse_event({"message": "The assistant is busy, please try again shortly.", "retry_after": e.retry_after}, "error")
+            return
+        except Exception as e:
+            singleflight.finish(key, flight, error=e)
+            yield sse_event({"message": "I apologize, but there was an error processing your request. Please try again."}, "error")
+            return
+        finally:
+            # Release any waiters if the client disconnected mid-stream
+            singleflight.finish(key, flight, error=ConnectionAbortedError("Stream closed before completion"))
+        yield sse_event({"response": response}, "done")
+
+    # Compact once the stream has closed, so the page isn't kept waiting on the summary call
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(compact_chat_history, user_id),
+    )
+
 @app.get("/chat_history")
 async def chat_history(request: Request):
     current_user = get_current_user(request)
     user_id = uuid.UUID(current_user['id'])
     
     history = await get_chat_history(user_id)
-    return {"history": history}
+    return {"history": [row for row in history if row.get("chat_type") != SUMMARY_CHAT_TYPE]}
+
+@app.post("/video_analysis/{analysis_id}/follow_up")
+async def video_follow_up(request: Request, analysis_id: str, message: str = Form(...), deep_analysis: bool = Form(False)):
+    current_user = get_current_user(request)
+    user_id = uuid.UUID(current_user['id'])
+
+    analysis = await get_video_analysis(analysis_id, user_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Video analysis not found")
+    if not analysis.get("content_hash"):
+        raise HTTPException(status_code=410, detail="This video is no longer available for follow-up questions, please upload it again.")
+
+    response = await chatbot.follow_up_video(user_id, analysis["content_hash"], analysis["analysis"], message, deep=deep_analysis)
+    await async_insert_chat_message(user_id, message, 'text')
+    await async_insert_chat_message(user_id, response, 'bot')
+    return {"response": response}
 
 @app.get("/video_analysis_history")
 async def video_analysis_history(request: Request):
@@ -194,5 +688,27 @@ async def video_analysis_history(request: Request):
     history = await get_video_analysis_history(user_id)
     return {"history": history}
 
+def require_metrics_access(request: Request):
+    # Metrics name top spenders by user id and describe internals, so they are never public
+    if METRICS_TOKEN:
+        authorization = request.headers.get("authorization", "")
+        if not secrets.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Metrics are only available locally")
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_access)])
+async def metrics():
+    return {
+        "response_cache": await chatbot.response_cache.stats(),
+        "scheduler": chatbot.scheduler.metrics(),
+        "resilience": chatbot.resilience.metrics(),
+        "routing": chatbot.router.metrics(),
+        "usage": chatbot.usage.metrics(),
+        "file_watcher": chatbot.file_watcher.metrics(),
+        "video_dedupe": await video_index.stats(),
+        "temp_storage": await temp_storage.metrics(),
+    }
+
 if __name__ == '__main__':
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
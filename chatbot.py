@@ -1,8 +1,21 @@
 import os
+import json
 import time
+import hashlib
+import asyncio
 import logging
-import google.generativeai as genai
 from dotenv import load_dotenv
+from llm_backend import create_backend
+from session_pool import ChatSessionPool
+from history_manager import ConversationWindow, select_window, summary_turns, encode_summary, content_text
+from file_watcher import FileStateWatcher
+from scheduler import FairScheduler, SchedulerSaturated
+from resilience import ResilientCaller, GeminiError, VideoProcessingError, VideoExpiredError, MalformedResponseError, classify
+from routing import ModelRouter
+from segmented_analysis import VIDEO_SEGMENT_CONCURRENCY, plan_segments, cut_segment, timestamp
+from analysis_lenses import ANALYSIS_LENSES, ANALYSIS_LENS_ATTEMPTS, LENS_TITLES, lens_prompt, merge_report
+from analysis_schema import STRUCTURED_OUTPUT_CONFIG, ANALYSIS_MAX_OUTPUT_TOKENS, ANALYSIS_ATTEMPTS, parse_analysis
+from usage import UsageTracker, usage_from, estimate_prompt_tokens
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -11,68 +24,491 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Get the API key
-api_key = os.getenv("GEMINI_API_KEY")
+DEFAULT_ANALYSIS_PROMPT = "Analyze this video advertisement. Provide insights on its effectiveness, target audience, key messages, and areas for improvement. Include a comprehensive analysis of audience engagement, messaging & storytelling, visual & audio elements, brand consistency, and platform optimization."
 
-if not api_key:
-    raise ValueError("No GEMINI_API_KEY found in environment variables. Please set it in your .env file.")
+def history_to_turns(history):
+    # Convert user_chat_history rows (newest first) into alternating Gemini turns
+    turns = []
+    for row in reversed(history):
+        role = "model" if row.get("chat_type") == "bot" else "user"
+        if not row.get("message"):
+            continue
+        if turns and turns[-1]["role"] == role:
+            turns[-1]["parts"].append(row["message"])
+        else:
+            turns.append({"role": role, "parts": [row["message"]]})
+    # The preamble ends with a model turn and the next message is a user turn
+    if turns and turns[0]["role"] == "model":
+        turns.pop(0)
+    if turns and turns[-1]["role"] == "user":
+        turns.pop()
+    return turns
 
-# Configure the generative AI
-genai.configure(api_key=api_key)
+async def read_response(request):
+    # Reading .text raises for blocked or empty responses, so do it inside the guarded call
+    response = await request
+    return response.text, usage_from(getattr(response, "usage_metadata", None))
 
 class Chatbot:
-    def __init__(self):
+    def __init__(self, backend=None, response_cache=None, scheduler=None, resilience=None, usage=None, file_registry=None,
+                 segment_cache=None):
+        self.backend = backend or create_backend()
         self.generation_config = {
             "temperature": 0.9,
             "top_p": 1,
             "top_k": 1,
             "max_output_tokens": 2048,
         }
-        self.model = genai.GenerativeModel(
-            model_name="gemini-1.5-pro-latest",
-            generation_config=self.generation_config,
+        self.router = ModelRouter(self.backend, self.generation_config)
+        # Chat sessions live on the default tier
+        self.model = self.router.model("chat")
+        self.preamble = [
+            {
+                "role": "user",
+                "parts": ["You are a world-class video ads and creative analyzer. You can analyze both text and video content."],
+            },
+            {
+                "role": "model",
+                "parts": ["Understood. As a world-class video ads and creative analyzer, I'm ready to provide expert insights on both text and video content. My analysis will cover various aspects such as audience engagement, messaging effectiveness, visual and audio elements, brand consistency, and platform optimization. Whether you have a specific question about an ad or need a comprehensive analysis of a video, I'm here to help. What would you like me to analyze today?"],
+            },
+        ]
+        self.sessions = ChatSessionPool()
+        self.response_cache = response_cache
+        self.scheduler = scheduler or FairScheduler()
+        self.resilience = resilience or ResilientCaller()
+        self.usage = usage or UsageTracker()
+        self.file_registry = file_registry
+        self.segment_cache = segment_cache
+        self.window = ConversationWindow(self.router.model("summary"), len(self.preamble))
+        # Users with a compaction in progress
+        self.compacting = set()
+        self.file_watcher = FileStateWatcher(self.backend)
+
+    def start_session(self, history=None):
+        summary, rows = select_window(history or [])
+        return self.model.start_chat(history=self.preamble + summary_turns(summary) + history_to_turns(rows))
+
+    def get_session(self, user_id, history=None):
+        session = self.sessions.get(user_id)
+        if session is None:
+            # New or evicted user: rebuild the session from their stored history
+            session = self.start_session(history)
+            self.sessions.put(user_id, session)
+        return session
+
+    def routed_session(self, session, route):
+        # Other tiers borrow a copy of the session's history for a single turn
+        model = self.router.model(route)
+        if model.model_name == session.model.model_name:
+            return session
+        return model.start_chat(history=list(session.history))
+
+    def merge_turn(self, session, routed):
+        if routed is not session:
+            session.history = list(session.history) + list(routed.history[-2:])
+
+    def cache_key(self, kind, prompt, route, video_hash=None, use_cache=True, session=None):
+        if not use_cache or self.response_cache is None or not self.response_cache.enabled:
+            return None
+        return self.response_cache.make_key(
+            kind, prompt, self.preamble, self.router.model_name(route), self.router.generation_config_for(route), video_hash,
+            self.context_digest(session) if session is not None else None,
         )
-        self.chat_session = self.model.start_chat(
-            history=[
-                {
-                    "role": "user",
-                    "parts": ["You are a world-class video ads and creative analyzer. You can analyze both text and video content."],
-                },
-                {
-                    "role": "model",
-                    "parts": ["Understood. As a world-class video ads and creative analyzer, I'm ready to provide expert insights on both text and video content. My analysis will cover various aspects such as audience engagement, messaging effectiveness, visual and audio elements, brand consistency, and platform optimization. Whether you have a specific question about an ad or need a comprehensive analysis of a video, I'm here to help. What would you like me to analyze today?"],
-                },
-            ]
+
+    def context_digest(self, session):
+        # Chat replies depend on the conversation so far: only a fresh session's reply is shared across users
+        turns = list(session.history)[len(self.preamble):]
+        if not turns:
+            return None
+        visible = [[turn["role"] if isinstance(turn, dict) else turn.role, content_text(turn)] for turn in turns]
+        return hashlib.sha256(json.dumps(visible).encode()).hexdigest()
+
+    async def cached_reply(self, user_id, session, message, cache_key):
+        cached = await self.response_cache.get(cache_key, "chat")
+        if cached is not None:
+            # Record the turn so later messages still see it in context
+            async with self.sessions.lock(user_id):
+                session.history = list(session.history) + [
+                    {"role": "user", "parts": [message]},
+                    {"role": "model", "parts": [cached]},
+                ]
+        return cached
+
+    async def call_gemini(self, user_id, func, hedge=False):
+        # Each attempt takes its own scheduler slot so backoff sleeps don't hold one
+        return await self.resilience.call(
+            lambda: self.scheduler.run(user_id, func),
+            hedge=hedge,
+            passthrough=(SchedulerSaturated,),
         )
 
-    def send_message(self, message):
+    async def send_message(self, user_id, message, history=None, use_cache=True, deep=False):
+        session = self.get_session(user_id, history)
+        route = self.router.route(message, deep=deep)
+        cache_key = self.cache_key("chat", message, route, use_cache=use_cache, session=session)
+        if cache_key:
+            cached = await self.cached_reply(user_id, session, message, cache_key)
+            if cached is not None:
+                return cached
         try:
-            response = self.chat_session.send_message(message)
-            return response.text
-        except Exception as e:
+            async with self.sessions.lock(user_id):
+                routed = self.routed_session(session, route)
+                generation_config = self.router.generation_config_for(route)
+                estimated = estimate_prompt_tokens(message, routed.history)
+                started = time.monotonic()
+                text, usage = await self.call_gemini(
+                    user_id,
+                    lambda: read_response(routed.send_message_async(message, generation_config=generation_config)),
+                )
+                elapsed = time.monotonic() - started
+                self.router.record(route, elapsed)
+                self.usage.record(user_id, route, usage, estimated, elapsed)
+                self.merge_turn(session, routed)
+        except GeminiError as e:
             logger.error(f"Error sending message: {str(e)}")
-            return "I apologize, but there was an error processing your request. Please try again."
+            raise
+        if cache_key:
+            await self.response_cache.set(cache_key, text)
+        return text
+
+    async def stream_message(self, user_id, message, history=None, use_cache=True, deep=False):
+        session = self.get_session(user_id, history)
+        route = self.router.route(message, deep=deep)
+        cache_key = self.cache_key("chat", message, route, use_cache=use_cache, session=session)
+        if cache_key:
+            cached = await self.cached_reply(user_id, session, message, cache_key)
+            if cached is not None:
+                yield cached
+                return
+        async with self.sessions.lock(user_id), self.scheduler.slot(user_id):
+            finished = False
+            try:
+                chunks = []
+                usage = None
+                routed = self.routed_session(session, route)
+                generation_config = self.router.generation_config_for(route)
+                estimated = estimate_prompt_tokens(message, routed.history)
+                started = time.monotonic()
+                # Only opening the stream is retried; nothing has been sent to the client yet
+                response = await self.resilience.call(
+                    lambda: routed.send_message_async(message, stream=True, generation_config=generation_config)
+                )
+                async for chunk in response:
+                    # Usage arrives with the chunks; the last one carries the final counts
+                    usage = usage_from(getattr(chunk, "usage_metadata", None)) or usage
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        yield chunk.text
+                elapsed = time.monotonic() - started
+                self.router.record(route, elapsed)
+                self.usage.record(user_id, route, usage, estimated, elapsed)
+                self.merge_turn(session, routed)
+                finished = True
+                if cache_key:
+                    await self.response_cache.set(cache_key, "".join(chunks))
+            except Exception as e:
+                logger.error(f"Error streaming message: {str(e)}")
+                if isinstance(e, GeminiError):
+                    raise
+                raise classify(e) from e
+            finally:
+                # A half-read stream (an error, or the client disconnecting) leaves the session unusable;
+                # rebuild it next time
+                if not finished:
+                    self.sessions.discard(user_id)
+
+    async def compact_history(self, user_id):
+        # Fold old turns into the rolling summary; returns the summary row to store, if any
+        session = self.sessions.get(user_id)
+        if session is None or user_id in self.compacting:
+            # At most one compaction per user; the next message schedules another anyway
+            return None
+        self.compacting.add(user_id)
+        try:
+            # Only the summary call takes a scheduler slot, and only once the session lock is released,
+            # so compactions never hold a slot while turns hold the lock
+            result = await self.window.compact(
+                session, self.sessions.lock(user_id), run=lambda func: self.scheduler.run(user_id, func),
+            )
+        except Exception as e:
+            logger.error(f"Error compacting chat history: {str(e)}")
+            return None
+        finally:
+            self.compacting.discard(user_id)
+        if result is None:
+            return None
+        summary, kept, usage = result
+        self.usage.record(user_id, "summary", usage_from(usage))
+        return encode_summary(summary, kept)
 
-    def analyze_video(self, video_path, prompt=''):
+    async def uploaded_file(self, user_id, video_hash):
+        # A still-active Gemini file uploaded for these bytes, by this user or another, if any
+        if self.file_registry is None or user_id is None or video_hash is None:
+            return None
+        name = await self.file_registry.get(user_id, video_hash)
+        if name is None:
+            return None
         try:
-            logger.info(f"Uploading video file: {video_path}")
-            video_file = genai.upload_file(video_path)
-            
-            logger.info("Waiting for video processing...")
-            while video_file.state.name == "PROCESSING":
-                time.sleep(5)
-                video_file = genai.get_file(video_file.name)
+            video_file = await self.resilience.call(lambda: asyncio.to_thread(self.backend.get_file, name))
+            # A pipelined upload may still be processing
+            video_file = await self.file_watcher.wait(video_file)
+        except GeminiError as e:
+            logger.warning(f"Registered Gemini file {name} is no longer usable: {str(e)}")
+            video_file = None
+        if video_file is None or video_file.state.name != "ACTIVE":
+            await self.file_registry.discard(user_id, video_hash)
+            return None
+        return video_file
+
+    async def prepare_video(self, video_path, video_hash, user_id, report):
+        # Returns an ACTIVE Gemini file for the video, reusing this user's earlier upload when possible
+        video_file = await self.uploaded_file(user_id, video_hash)
+        if video_file is not None:
+            logger.info(f"Reusing uploaded Gemini file {video_file.name}")
+            return video_file
+
+        logger.info(f"Uploading video file: {video_path}")
+        await report("uploading", 0.1)
+        video_file = await self.call_gemini(user_id, lambda: asyncio.to_thread(self.backend.upload_file, video_path))
+
+        logger.info("Waiting for video processing...")
+        await report("processing", 0.3)
+        video_file = await self.file_watcher.wait(video_file)
+
+        if video_file.state.name == "FAILED":
+            raise VideoProcessingError(f"Video processing failed: {video_file.state.name}")
+        if self.file_registry is not None and user_id is not None and video_hash is not None:
+            await self.file_registry.put(user_id, video_hash, video_file)
+        return video_file
 
-            if video_file.state.name == "FAILED":
-                raise ValueError(f"Video processing failed: {video_file.state.name}")
+    async def keep_video(self, video_path, video_hash, user_id):
+        # Follow-up questions need a Gemini file of these bytes, including when the analysis itself was
+        # served from a cache; a no-op when one is already registered
+        async def report(stage, fraction):
+            pass
 
+        try:
+            await self.prepare_video(video_path, video_hash, user_id, report)
+        except (GeminiError, SchedulerSaturated) as e:
+            logger.warning(f"Could not keep video {video_hash[:12]} for follow-up questions: {str(e)}")
+
+    async def generate(self, user_id, route, contents, prompt_text, model=None, structured=False):
+        # `structured` constrains the output to the analysis JSON schema, with room for the whole object.
+        # A response that still doesn't parse is generated again, then fails with MalformedResponseError.
+        if not structured:
+            return await self.generate_once(user_id, route, contents, prompt_text, model)
+        generation_config = self.router.generation_config_for(route)
+        generation_config = {
+            **generation_config,
+            **STRUCTURED_OUTPUT_CONFIG,
+            "max_output_tokens": max(generation_config["max_output_tokens"], ANALYSIS_MAX_OUTPUT_TOKENS),
+        }
+        for attempt in range(1, ANALYSIS_ATTEMPTS + 1):
+            text = await self.generate_once(user_id, route, contents, prompt_text, model, generation_config)
+            if parse_analysis(text) is not None:
+                return text
+            logger.warning(f"Malformed structured analysis (attempt {attempt} of {ANALYSIS_ATTEMPTS})")
+        raise MalformedResponseError("The analysis came back incomplete, please try again")
+
+    async def generate_once(self, user_id, route, contents, prompt_text, model=None, generation_config=None):
+        # One stateless generation on the route's tier, with usage and latency recorded
+        model = model or self.router.model(route)
+        generation_config = generation_config or self.router.generation_config_for(route)
+        # The estimate covers the prompt text only; video tokens depend on its length
+        estimated = estimate_prompt_tokens(prompt_text)
+        started = time.monotonic()
+        # Generation is stateless, so a slow attempt may be hedged with a duplicate
+        text, usage = await self.call_gemini(
+            user_id,
+            lambda: read_response(model.generate_content_async(contents, generation_config=generation_config, request_options={"timeout": 300})),
+            hedge=True,
+        )
+        elapsed = time.monotonic() - started
+        self.router.record(route, elapsed)
+        self.usage.record(user_id, route, usage, estimated, elapsed)
+        return text
+
+    async def analyze_video(self, video_path, prompt='', video_hash=None, use_cache=True, user_id=None, deep=False, progress=None,
+                            structured=True):
+        async def report(stage, fraction):
+            if progress is not None:
+                await progress(stage, fraction)
+
+        full_prompt = f"{DEFAULT_ANALYSIS_PROMPT}\n\nAdditional instructions: {prompt}" if prompt else DEFAULT_ANALYSIS_PROMPT
+        route = self.router.route(prompt, has_video=True, deep=deep)
+        
+        # JSON and prose answers to the same prompt are cached apart
+        kind = "video_json" if structured else "video"
+        cache_key = self.cache_key(kind, full_prompt, route, video_hash, use_cache) if video_hash else None
+        if cache_key:
+            cached = await self.response_cache.get(cache_key, "video")
+            # Entries cached before structured responses were validated may be truncated JSON
+            if cached is not None and (not structured or parse_analysis(cached) is not None):
+                return cached
+
+        try:
+            video_file = await self.prepare_video(video_path, video_hash, user_id, report)
             logger.info("Video processing complete. Generating analysis...")
-            default_prompt = "Analyze this video advertisement. Provide insights on its effectiveness, target audience, key messages, and areas for improvement. Include a comprehensive analysis of audience engagement, messaging & storytelling, visual & audio elements, brand consistency, and platform optimization."
-            
-            full_prompt = f"{default_prompt}\n\nAdditional instructions: {prompt}" if prompt else default_prompt
-            
-            response = self.model.generate_content([video_file, full_prompt], request_options={"timeout": 300})
-            return response.text
-        except Exception as e:
+            await report("generating", 0.6)
+            text = await self.generate(user_id, route, [video_file, full_prompt], full_prompt, structured=structured)
+        except GeminiError as e:
             logger.error(f"Error analyzing video: {str(e)}")
-            return f"An error occurred during video analysis: {str(e)}"
+            raise
+        if cache_key:
+            await self.response_cache.set(cache_key, text)
+        return text
+
+    async def analyze_video_segmented(self, video_path, duration, prompt='', video_hash=None, prompt_key=None,
+                                      use_cache=True, user_id=None, deep=False, progress=None):
+        # Map: analyze time segments concurrently. Reduce: merge their findings in one text-only call.
+        # Without `use_cache` every segment is analyzed again; the fresh findings still replace the cached ones.
+        segments = plan_segments(duration)
+        semaphore = asyncio.Semaphore(VIDEO_SEGMENT_CONCURRENCY)
+        done = 0
+        logger.info(f"Analyzing {video_path} as {len(segments)} segments")
+
+        async def analyze_segment(index, start, end):
+            nonlocal done
+            cache_key = None
+            if self.segment_cache is not None and video_hash and prompt_key:
+                cache_key = self.segment_cache.make_key(video_hash, start, end, prompt_key)
+                cached = await self.segment_cache.get(cache_key) if use_cache else None
+                if cached is not None:
+                    done += 1
+                    return cached
+            instructions = (
+                f"This clip is {timestamp(start)}-{timestamp(end)} of a {timestamp(duration)} video. "
+                f"Report findings for this part only and give timestamps relative to the full video (add {timestamp(start)})."
+            )
+            if prompt:
+                instructions += f" {prompt}"
+            segment_path = f"{video_path}.part{index}{os.path.splitext(video_path)[1]}"
+            async with semaphore:
+                try:
+                    await cut_segment(video_path, start, end, segment_path)
+                    findings = await self.analyze_video(
+                        segment_path, instructions, use_cache=False, user_id=user_id, deep=deep, structured=False
+                    )
+                finally:
+                    if os.path.exists(segment_path):
+                        os.remove(segment_path)
+            if cache_key:
+                await self.segment_cache.set(cache_key, findings)
+            done += 1
+            if progress is not None:
+                await progress(f"segment {done}/{len(segments)}", 0.1 + 0.7 * done / len(segments))
+            return findings
+
+        results = await asyncio.gather(
+            *(analyze_segment(i, start, end) for i, (start, end) in enumerate(segments)), return_exceptions=True
+        )
+        failed = [r for r in results if isinstance(r, BaseException)]
+        if failed:
+            # Finished segments stay cached, so a retry only redoes these
+            logger.error(f"{len(failed)} of {len(segments)} segments failed")
+            raise failed[0]
+
+        if progress is not None:
+            await progress("merging", 0.85)
+        route = self.router.route(prompt, has_video=True, deep=deep)
+        findings = "\n\n".join(
+            f"Segment {timestamp(start)}-{timestamp(end)}:\n{text}" for (start, end), text in zip(segments, results)
+        )
+        reduce_prompt = (
+            f"{DEFAULT_ANALYSIS_PROMPT}\n\n"
+            + (f"Additional instructions: {prompt}\n\n" if prompt else "")
+            + "You analyzed the video in consecutive segments. Merge the segment findings below into one analysis "
+            "of the whole video, keeping the most important timestamps.\n\n"
+            + findings
+        )
+        return await self.generate(user_id, route, reduce_prompt, reduce_prompt, structured=True)
+
+    async def analyze_video_lenses(self, video_path, prompt='', video_hash=None, use_cache=True, user_id=None, deep=False,
+                                   progress=None, on_section=None):
+        # One upload, then one generation per lens against the same file, all in flight at once.
+        # `on_section(key, title, text)` is awaited as each lens finishes, in completion order.
+        async def report(stage, fraction):
+            if progress is not None:
+                await progress(stage, fraction)
+
+        route = self.router.route(prompt, has_video=True, deep=deep)
+        try:
+            video_file = await self.prepare_video(video_path, video_hash, user_id, report)
+        except GeminiError as e:
+            logger.error(f"Error preparing video for lens analysis: {str(e)}")
+            raise
+        await report("generating", 0.4)
+
+        async def analyze_lens(key, lens_text):
+            full_prompt = lens_prompt(lens_text, prompt)
+            cache_key = self.cache_key("video", full_prompt, route, video_hash, use_cache) if video_hash else None
+            if cache_key:
+                cached = await self.response_cache.get(cache_key, "video")
+                if cached is not None:
+                    return key, cached
+            try:
+                text = await self.generate(user_id, route, [video_file, full_prompt], full_prompt)
+            except Exception as e:
+                # Includes SchedulerSaturated: one lens not getting a slot shouldn't sink the report
+                logger.error(f"Lens {key} failed: {str(e)}")
+                return key, e
+            if cache_key:
+                await self.response_cache.set(cache_key, text)
+            return key, text
+
+        sections = {}
+        errors = {}
+        pending = [(key, text) for key, _, text in ANALYSIS_LENSES]
+        for attempt in range(1, ANALYSIS_LENS_ATTEMPTS + 1):
+            tasks = [asyncio.ensure_future(analyze_lens(key, text)) for key, text in pending]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    key, result = await finished
+                    if isinstance(result, Exception):
+                        errors[key] = result
+                        continue
+                    errors.pop(key, None)
+                    sections[key] = result
+                    if on_section is not None:
+                        await on_section(key, LENS_TITLES[key], result)
+                    await report(f"{len(sections)}/{len(ANALYSIS_LENSES)} sections", 0.4 + 0.5 * len(sections) / len(ANALYSIS_LENSES))
+            finally:
+                # Don't keep spending quota and scheduler slots on a report that is no longer wanted
+                for task in tasks:
+                    task.cancel()
+            pending = [(key, text) for key, _, text in ANALYSIS_LENSES if key in errors]
+            if not pending:
+                break
+            if attempt < ANALYSIS_LENS_ATTEMPTS:
+                logger.warning(f"Retrying {len(pending)} failed lenses (attempt {attempt + 1} of {ANALYSIS_LENS_ATTEMPTS})")
+        if not sections:
+            raise next(iter(errors.values()))
+        if errors:
+            # Finished lenses stay cached, so a reanalysis only redoes the failed ones
+            logger.warning(f"{len(errors)} of {len(ANALYSIS_LENSES)} lenses failed; the report notes the missing sections")
+        return merge_report(sections)
+
+    async def follow_up_video(self, user_id, video_hash, analysis, message, deep=False):
+        # Answer a question about an analyzed video with its already uploaded file: one generation, no upload
+        video_file = await self.uploaded_file(user_id, video_hash)
+        if video_file is None:
+            # Uploading the same bytes again registers a fresh file, even when the analysis is deduplicated
+            raise VideoExpiredError("This video is no longer available for follow-up questions, please upload it again.")
+
+        route = self.router.route(message, has_video=True, deep=deep)
+        prompt = f"Your earlier analysis of this video:\n{analysis}\n\nFollow-up question: {message}"
+        try:
+            text = await self.generate(user_id, route, [video_file, prompt], prompt)
+        except GeminiError as e:
+            logger.error(f"Error answering video follow-up: {str(e)}")
+            raise
+
+        # Let the chat remember the exchange without carrying the video in every turn
+        session = self.sessions.get(user_id)
+        if session is not None:
+            async with self.sessions.lock(user_id):
+                session.history = list(session.history) + [
+                    {"role": "user", "parts": [f"About the video I analyzed earlier: {message}"]},
+                    {"role": "model", "parts": [text]},
+                ]
+        return text
@@ -47,7 +47,7 @@ def check_user_exists(user_id: uuid.UUID) -> bool:
         raise
 
 async def async_insert_chat_message(user_id: uuid.UUID, message: str, chat_type: str = 'text') -> Dict:
-    user_exists = check_user_exists(user_id)
+    user_exists = await asyncio.to_thread(check_user_exists, user_id)
     if not user_exists:
         raise ValueError(f"User with id {user_id} does not exist")
     try:
@@ -96,7 +96,7 @@ async def get_chat_history(user_id: uuid.UUID, limit: int = 50) -> List[Dict]:
         logger.error(f"Error getting chat history: {str(e)}")
         raise
 
-async def insert_video_analysis(user_id: uuid.UUID, upload_file_name: str, analysis: str, video_duration: Optional[str] = None, video_format: Optional[str] = None) -> Dict:
+async def insert_video_analysis(user_id: uuid.UUID, upload_file_name: str, analysis: str, video_duration: Optional[str] = None, video_format: Optional[str] = None, content_hash: Optional[str] = None, prompt_hash: Optional[str] = None, processing_seconds: Optional[float] = None, details: Optional[Dict] = None, deduplicated: bool = False) -> Dict:
     try:
         new_analysis = {
             "user_id": str(user_id),
@@ -104,18 +104,22 @@ async def insert_video_analysis(user_id: uuid.UUID, upload_file_name: str, analy
             "analysis": analysis,
             "video_duration": video_duration,
             "video_format": video_format,
+            "content_hash": content_hash,
+            "prompt_hash": prompt_hash,
+            "processing_seconds": processing_seconds,
+            # Copies of an earlier analysis keep its processing time and are marked here
+            "deduplicated": deduplicated,
+            # Summary, scores and the other typed fields of a structured analysis
+            **(details or {}),
             "TIMESTAMP": datetime.now(timezone.utc).isoformat()
         }
         
-        cache_key = f"video_analysis_history:{user_id}"
-        
-        async def db_write_func(value):
-            return await asyncio.to_thread(
-                supabase.table("video_analysis_output").insert(value).execute
-            )
-        
-        # Use write-through cache
-        await write_through_cache(cache_key, new_analysis, db_write_func)
+        await asyncio.to_thread(supabase.table("video_analysis_output").insert(new_analysis).execute)
+        # The cached history list is rebuilt from the table on the next read
+        try:
+            await asyncio.to_thread(get_redis_client().delete, f"video_analysis_history:{user_id}")
+        except Exception as e:
+            logger.error(f"Error invalidating video analysis history cache: {str(e)}")
         
         logger.info(f"Successfully inserted video analysis for user {user_id}")
         return new_analysis
@@ -123,6 +127,9 @@ async def insert_video_analysis(user_id: uuid.UUID, upload_file_name: str, analy
         logger.error(f"Error inserting video analysis: {str(e)}")
         raise
 
+# The history list reads the summary fields only, never the full analysis text
+VIDEO_ANALYSIS_LIST_COLUMNS = ["id", "TIMESTAMP", "upload_file_name", "summary", "overall_score", "scores", "video_duration", "video_format", "content_hash"]
+
 async def get_video_analysis_history(user_id: uuid.UUID, limit: int = 10) -> List[Dict]:
     try:
         cache_key = f"video_analysis_history:{user_id}"
@@ -132,7 +139,7 @@ async def get_video_analysis_history(user_id: uuid.UUID, limit: int = 10) -> Lis
             return cached_history[:limit]
         
         response = await asyncio.to_thread(
-            supabase.table("video_analysis_output").select("*").eq("user_id", str(user_id)).order("TIMESTAMP", desc=True).limit(limit).execute
+            supabase.table("video_analysis_output").select(*VIDEO_ANALYSIS_LIST_COLUMNS).eq("user_id", str(user_id)).order("TIMESTAMP", desc=True).limit(limit).execute
         )
         history = response.data
         
@@ -144,3 +151,25 @@ async def get_video_analysis_history(user_id: uuid.UUID, limit: int = 10) -> Lis
     except Exception as e:
         logger.error(f"Error getting video analysis history: {str(e)}")
         raise
+
+async def find_video_analysis(content_hash: str, prompt_hash: str) -> Optional[Dict]:
+    # Latest analysis of the same bytes with the same prompt, by any user; only rows that were really analyzed,
+    # so the processing time a hit saves is never a copy's
+    try:
+        response = await asyncio.to_thread(
+            supabase.table("video_analysis_output").select("*").eq("content_hash", content_hash).eq("prompt_hash", prompt_hash).eq("deduplicated", False).order("TIMESTAMP", desc=True).limit(1).execute
+        )
+        return response.data[0] if response.data else None
+    except Exception as e:
+        logger.error(f"Error looking up video analysis by content hash: {str(e)}")
+        return None
+
+async def get_video_analysis(analysis_id: str, user_id: uuid.UUID) -> Optional[Dict]:
+    try:
+        response = await asyncio.to_thread(
+            supabase.table("video_analysis_output").select("*").eq("id", analysis_id).eq("user_id", str(user_id)).limit(1).execute
+        )
+        return response.data[0] if response.data else None
+    except Exception as e:
+        logger.error(f"Error getting video analysis {analysis_id}: {str(e)}")
+        raise
@@ -0,0 +1,72 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from redis_config import get_redis_client
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Uploaded Gemini files expire after 48 hours; assume this lifetime when the API doesn't report one (seconds)
+GEMINI_FILE_TTL = int(os.getenv("GEMINI_FILE_TTL", str(47 * 3600)))
+
+# Stop handing out a file this many seconds before it expires
+GEMINI_FILE_EXPIRY_MARGIN = int(os.getenv("GEMINI_FILE_EXPIRY_MARGIN", "600"))
+
+def expires_at(file):
+    expiration = getattr(file, "expiration_time", None)
+    if expiration is not None and hasattr(expiration, "timestamp"):
+        return expiration.timestamp()
+    return time.time() + GEMINI_FILE_TTL
+
+class FileRegistry:
+    # Per-user uploaded Gemini file handles, keyed by the video's content hash. The latest upload of each
+    # video is also kept under the hash alone, so users who upload the same bytes can share it.
+    def __init__(self, margin=GEMINI_FILE_EXPIRY_MARGIN, prefix="gemini_file"):
+        self.margin = margin
+        self.prefix = prefix
+
+    def _key(self, user_id, content_hash):
+        return f"{self.prefix}:{user_id}:{content_hash}"
+
+    def _shared_key(self, content_hash):
+        return f"{self.prefix}:shared:{content_hash}"
+
+    async def put(self, user_id, content_hash, file):
+        ttl = int(expires_at(file) - time.time() - self.margin)
+        if ttl <= 0:
+            return
+        value = json.dumps({"name": file.name, "uri": getattr(file, "uri", None)})
+
+        def store():
+            redis_client = get_redis_client()
+            redis_client.setex(self._key(user_id, content_hash), ttl, value)
+            redis_client.setex(self._shared_key(content_hash), ttl, value)
+
+        try:
+            await asyncio.to_thread(store)
+        except Exception as e:
+            logger.error(f"Error registering Gemini file {file.name}: {str(e)}")
+
+    async def get(self, user_id, content_hash):
+        # Returns the stored file name, this user's own upload first, or None if no upload of these bytes
+        # is left or all are about to expire
+        try:
+            own, shared = await asyncio.to_thread(
+                get_redis_client().mget, self._key(user_id, content_hash), self._shared_key(content_hash)
+            )
+        except Exception as e:
+            logger.error(f"Error reading Gemini file registry: {str(e)}")
+            return None
+        raw = own or shared
+        return json.loads(raw)["name"] if raw else None
+
+    async def discard(self, user_id, content_hash):
+        try:
+            await asyncio.to_thread(
+                get_redis_client().delete, self._key(user_id, content_hash), self._shared_key(content_hash)
+            )
+        except Exception as e:
+            logger.error(f"Error removing Gemini file from registry: {str(e)}")
@@ -0,0 +1,108 @@
+import os
+import time
+import asyncio
+import logging
+from resilience import VideoProcessingError, is_transient, classify
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A newly uploaded file is checked after this many seconds, then less often up to the maximum
+FILE_WATCH_INITIAL_INTERVAL = float(os.getenv("FILE_WATCH_INITIAL_INTERVAL", "1"))
+FILE_WATCH_MAX_INTERVAL = float(os.getenv("FILE_WATCH_MAX_INTERVAL", "10"))
+FILE_WATCH_BACKOFF = float(os.getenv("FILE_WATCH_BACKOFF", "1.5"))
+
+# Give up on a file that is still processing after this many seconds
+FILE_WATCH_TIMEOUT = float(os.getenv("FILE_WATCH_TIMEOUT", "600"))
+
+# State checks issued at once per poll
+FILE_WATCH_BATCH_SIZE = int(os.getenv("FILE_WATCH_BATCH_SIZE", "16"))
+
+class PendingFile:
+    def __init__(self, name, future, interval):
+        self.name = name
+        self.future = future
+        self.interval = interval
+        self.started = time.monotonic()
+        self.next_check = self.started + interval
+
+class FileStateWatcher:
+    def __init__(self, backend, initial_interval=FILE_WATCH_INITIAL_INTERVAL, max_interval=FILE_WATCH_MAX_INTERVAL,
+                 backoff=FILE_WATCH_BACKOFF, timeout=FILE_WATCH_TIMEOUT, batch_size=FILE_WATCH_BATCH_SIZE):
+        self.backend = backend
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._pending = {}
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._checks = 0
+
+    async def wait(self, file):
+        # Resolves with the file once it leaves PROCESSING (ACTIVE or FAILED)
+        if file.state.name != "PROCESSING":
+            return file
+        entry = self._pending.get(file.name)
+        if entry is None:
+            entry = PendingFile(file.name, asyncio.get_running_loop().create_future(), self.initial_interval)
+            self._pending[file.name] = entry
+            self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        # Shielded so one waiter giving up doesn't cancel the result for the others
+        return await asyncio.shield(entry.future)
+
+    async def _run(self):
+        # A single poller serves every pending file and exits once none are left
+        while self._pending:
+            now = time.monotonic()
+            due = sorted((e for e in self._pending.values() if e.next_check <= now), key=lambda e: e.next_check)
+            if not due:
+                self._wakeup.clear()
+                delay = min(e.next_check for e in self._pending.values()) - now
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            batch = due[:self.batch_size]
+            results = await asyncio.gather(
+                *(asyncio.to_thread(self.backend.get_file, entry.name) for entry in batch), return_exceptions=True
+            )
+            self._checks += len(batch)
+            for entry, result in zip(batch, results):
+                self._update(entry, result)
+
+    def _update(self, entry, result):
+        if entry.future.done():
+            self._pending.pop(entry.name, None)
+            return
+        if isinstance(result, Exception) and not is_transient(result):
+            self._resolve(entry, error=classify(result))
+            return
+        if not isinstance(result, Exception) and result.state.name != "PROCESSING":
+            logger.info(f"File {entry.name} is {result.state.name} after {time.monotonic() - entry.started:.1f}s")
+            self._resolve(entry, result=result)
+            return
+        if time.monotonic() - entry.started >= self.timeout:
+            self._resolve(entry, error=VideoProcessingError(f"Video processing timed out after {self.timeout:.0f}s"))
+            return
+        # Still processing (or a transient error): check again later, less often each time
+        entry.interval = min(self.max_interval, entry.interval * self.backoff)
+        entry.next_check = time.monotonic() + entry.interval
+
+    def _resolve(self, entry, result=None, error=None):
+        self._pending.pop(entry.name, None)
+        if error is not None:
+            entry.future.set_exception(error)
+        else:
+            entry.future.set_result(result)
+
+    def metrics(self):
+        return {
+            "pending_files": len(self._pending),
+            "state_checks": self._checks,
+        }
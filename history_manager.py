@@ -0,0 +1,130 @@
+import os
+import json
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Token budget for the conversation turns sent with every chat request (preamble excluded)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+
+# After compaction the recent turns are trimmed down to this share of the budget
+HISTORY_TARGET_RATIO = float(os.getenv("HISTORY_TARGET_RATIO", "0.5"))
+
+# How many stored rows to read when rebuilding a session from user_chat_history
+HISTORY_REHYDRATE_LIMIT = int(os.getenv("HISTORY_REHYDRATE_LIMIT", "200"))
+
+SUMMARY_CHAT_TYPE = "summary"
+SUMMARY_PREFIX = "Summary of our earlier conversation:"
+SUMMARY_ACK = "Thanks, I'll keep that earlier context in mind."
+
+def estimate_tokens(text):
+    # Cheap pre-flight estimate: roughly four characters per token
+    return len(text) // 4 + 1 if text else 0
+
+def content_text(content):
+    if isinstance(content, dict):
+        return "\n".join(part for part in content.get("parts", []) if isinstance(part, str))
+    return "\n".join(part.text for part in content.parts if part.text)
+
+def content_parts(content):
+    if isinstance(content, dict):
+        return len(content.get("parts", []))
+    return len(content.parts)
+
+def summary_turns(summary):
+    if not summary:
+        return []
+    return [
+        {"role": "user", "parts": [f"{SUMMARY_PREFIX}\n{summary}"]},
+        {"role": "model", "parts": [SUMMARY_ACK]},
+    ]
+
+def encode_summary(summary, kept):
+    # `kept` is how many stored messages before this row are still in the live window
+    return json.dumps({"summary": summary, "kept": kept})
+
+def decode_summary(message):
+    try:
+        data = json.loads(message)
+        return data.get("summary", ""), int(data.get("kept", 0))
+    except (ValueError, TypeError, AttributeError):
+        return message, 0
+
+def select_window(history):
+    # Split user_chat_history rows (newest first) into the latest summary and the rows it does not cover
+    for index, row in enumerate(history):
+        if row.get("chat_type") != SUMMARY_CHAT_TYPE:
+            continue
+        summary, kept = decode_summary(row.get("message"))
+        older = [r for r in history[index + 1:] if r.get("chat_type") != SUMMARY_CHAT_TYPE]
+        return summary, history[:index] + older[:kept]
+    return None, history
+
+class ConversationWindow:
+    def __init__(self, model, preamble_length, token_budget=HISTORY_TOKEN_BUDGET, target_ratio=HISTORY_TARGET_RATIO):
+        self.model = model
+        self.preamble_length = preamble_length
+        self.token_budget = token_budget
+        self.target_ratio = target_ratio
+        self.summary_config = {"temperature": 0.2, "max_output_tokens": 512}
+
+    def split(self, history):
+        # Returns (existing summary, conversation turns) for a live session history
+        turns = list(history[self.preamble_length:])
+        if len(turns) >= 2 and content_text(turns[0]).startswith(SUMMARY_PREFIX):
+            return content_text(turns[0])[len(SUMMARY_PREFIX):].strip(), turns[2:]
+        return None, turns
+
+    def plan(self, turns):
+        # Index of the first turn to keep, or None when the window is within budget
+        sizes = [estimate_tokens(content_text(turn)) for turn in turns]
+        if sum(sizes) <= self.token_budget:
+            return None
+        target = self.token_budget * self.target_ratio
+        kept = 0
+        cut = len(turns)
+        while cut > 0 and kept + sizes[cut - 1] <= target:
+            cut -= 1
+            kept += sizes[cut]
+        # The kept window has to start on a user turn
+        while cut < len(turns) and turns[cut].role != "user":
+            cut += 1
+        return cut if cut > 0 else None
+
+    async def summarize(self, summary, turns):
+        transcript = "\n".join(f"{turn.role}: {content_text(turn)}" for turn in turns)
+        prompt = (
+            "Update the running summary of a conversation between a user and a video ads analyst. "
+            "Keep facts, decisions, ad details and open questions; drop pleasantries. "
+            "Answer with the updated summary only.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        response = await self.model.generate_content_async(prompt, generation_config=self.summary_config)
+        return response.text.strip(), getattr(response, "usage_metadata", None)
+
+    async def compact(self, session, lock, run=None):
+        # `run(func)` wraps the summary call (e.g. in a scheduler slot); it is never called while holding `lock`
+        async with lock:
+            history = list(session.history)
+        summary, turns = self.split(history)
+        cut = self.plan(turns)
+        if cut is None:
+            return None
+
+        folded = turns[:cut]
+        summarize = lambda: self.summarize(summary, folded)
+        new_summary, usage = await (run(summarize) if run is not None else summarize())
+
+        async with lock:
+            current = list(session.history)
+            if current[:len(history)] != history:
+                # The history was rewritten while summarizing (another compaction, a rebuilt session); leave it be
+                logger.info("Conversation history changed during compaction, skipping")
+                return None
+            # Only the tail can have grown while summarizing; keep whatever arrived since
+            kept = turns[cut:] + current[len(history):]
+            session.history = history[:self.preamble_length] + summary_turns(new_summary) + kept
+        logger.info(f"Folded {len(folded)} turns into the conversation summary, keeping {len(kept)}")
+        return new_summary, sum(content_parts(turn) for turn in kept), usage
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from redis_config import get_redis_client
+from resilience import GeminiError
+from scheduler import SchedulerSaturated
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Video analysis jobs run at once per worker process
+VIDEO_JOB_WORKERS = int(os.getenv("VIDEO_JOB_WORKERS", "2"))
+
+# How long finished jobs stay queryable (seconds)
+VIDEO_JOB_TTL = int(os.getenv("VIDEO_JOB_TTL", "86400"))
+
+# A running job whose worker stopped heartbeating for this long is put back on the queue
+VIDEO_JOB_LEASE = int(os.getenv("VIDEO_JOB_LEASE", "60"))
+
+# How often idle workers look for new jobs (seconds)
+VIDEO_JOB_POLL_INTERVAL = float(os.getenv("VIDEO_JOB_POLL_INTERVAL", "1"))
+
+# Runs a job gets while Gemini is saturated by interactive traffic before it fails with 429
+VIDEO_JOB_MAX_ATTEMPTS = int(os.getenv("VIDEO_JOB_MAX_ATTEMPTS", "10"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+class JobQueue:
+    # Jobs live in Redis so they survive page reloads and worker restarts:
+    #   <prefix>:<id>       JSON job record
+    #   <prefix>:queue      list of job ids waiting for a worker
+    #   <prefix>:running    sorted set of running job ids scored by last heartbeat
+    #   <prefix>:delayed    sorted set of job ids waiting to be requeued, scored by when they are due
+    def __init__(self, handler, workers=VIDEO_JOB_WORKERS, ttl=VIDEO_JOB_TTL, lease=VIDEO_JOB_LEASE,
+                 poll_interval=VIDEO_JOB_POLL_INTERVAL, max_attempts=VIDEO_JOB_MAX_ATTEMPTS, prefix="video_job"):
+        self.handler = handler
+        self.workers = workers
+        self.ttl = ttl
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self._tasks = []
+
+    def _key(self, job_id):
+        return f"{self.prefix}:{job_id}"
+
+    async def submit(self, user_id, params):
+        now = time.time()
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": str(user_id),
+            "state": JOB_QUEUED,
+            "stage": "queued",
+            "progress": 0.0,
+            "params": params,
+            "result": None,
+            "error": None,
+            "status_code": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self._save(job)
+        await asyncio.to_thread(get_redis_client().rpush, f"{self.prefix}:queue", job["id"])
+        logger.info(f"Queued video job {job['id']} for user {user_id}")
+        return job
+
+    async def get(self, job_id):
+        raw = await asyncio.to_thread(get_redis_client().get, self._key(job_id))
+        return json.loads(raw) if raw else None
+
+    async def update(self, job_id, **fields):
+        job = await self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields, updated_at=time.time())
+        await self._save(job)
+        return job
+
+    async def _save(self, job):
+        await asyncio.to_thread(get_redis_client().set, self._key(job["id"]), json.dumps(job), ex=self.ttl)
+
+    def start(self):
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker(n)) for n in range(self.workers)]
+        self._tasks.append(loop.create_task(self._recover()))
+        self._tasks.append(loop.create_task(self._promote()))
+        logger.info(f"Started {self.workers} video job workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, n):
+        redis_client = get_redis_client()
+        while True:
+            try:
+                job_id = await asyncio.to_thread(redis_client.lpop, f"{self.prefix}:queue")
+            except Exception as e:
+                logger.error(f"Video job worker {n} cannot reach Redis: {str(e)}")
+                job_id = None
+            if job_id is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self._run(job_id.decode() if isinstance(job_id, bytes) else job_id)
+
+    async def _run(self, job_id):
+        redis_client = get_redis_client()
+        await asyncio.to_thread(redis_client.zadd, f"{self.prefix}:running", {job_id: time.time()})
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(job_id))
+        try:
+            job = await self.get(job_id)
+            if job is None or job["state"] in (JOB_COMPLETED, JOB_FAILED):
+                return
+            job = await self.update(job_id, state=JOB_RUNNING, stage="starting", attempts=job["attempts"] + 1)
+
+            async def progress(stage, fraction, **fields):
+                # Extra fields (e.g. partial results) are stored on the job alongside the stage
+                await self.update(job_id, stage=stage, progress=fraction, **fields)
+
+            try:
+                result = await self.handler(job, progress)
+            except asyncio.CancelledError:
+                # Shutdown or reload: hand the job to the next worker instead of leaving it "running"
+                await self._requeue(job_id, "requeued")
+                logger.warning(f"Requeued video job {job_id} after its worker was stopped")
+                raise
+            except SchedulerSaturated as e:
+                # Interactive traffic has Gemini busy; that is no reason to lose a queued analysis
+                if self.will_defer(job):
+                    await self._requeue(job_id, "waiting for capacity", delay=e.retry_after)
+                    logger.warning(f"Deferred video job {job_id} for {e.retry_after}s, Gemini is saturated")
+                    return
+                logger.error(f"Video job {job_id} failed: {str(e)}")
+                await self.update(job_id, state=JOB_FAILED, stage="failed", error=str(e), status_code=429)
+                return
+            except Exception as e:
+                status_code = e.status_code if isinstance(e, GeminiError) else 500
+                logger.error(f"Video job {job_id} failed: {str(e)}")
+                await self.update(job_id, state=JOB_FAILED, stage="failed", error=str(e), status_code=status_code)
+                return
+            await self.update(job_id, state=JOB_COMPLETED, stage="completed", progress=1.0, result=result)
+            logger.info(f"Video job {job_id} completed")
+        finally:
+            heartbeat.cancel()
+            await asyncio.to_thread(redis_client.zrem, f"{self.prefix}:running", job_id)
+
+    def will_defer(self, job):
+        # Whether a run of `job` that finds Gemini saturated is requeued rather than failed
+        return job["attempts"] < self.max_attempts
+
+    async def _heartbeat(self, job_id):
+        redis_client = get_redis_client()
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(redis_client.zadd, f"{self.prefix}:running", {job_id: time.time()})
+            except Exception as e:
+                logger.warning(f"Failed to heartbeat video job {job_id}: {str(e)}")
+
+    async def _requeue(self, job_id, stage, delay=0):
+        await self.update(job_id, state=JOB_QUEUED, stage=stage)
+        if delay > 0:
+            await asyncio.to_thread(get_redis_client().zadd, f"{self.prefix}:delayed", {job_id: time.time() + delay})
+        else:
+            await asyncio.to_thread(get_redis_client().rpush, f"{self.prefix}:queue", job_id)
+
+    async def _promote(self):
+        # Move delayed jobs that are due onto the queue; zrem succeeds for only one process
+        redis_client = get_redis_client()
+        while True:
+            try:
+                due = await asyncio.to_thread(redis_client.zrangebyscore, f"{self.prefix}:delayed", 0, time.time())
+                for job_id in due:
+                    if await asyncio.to_thread(redis_client.zrem, f"{self.prefix}:delayed", job_id):
+                        await asyncio.to_thread(redis_client.rpush, f"{self.prefix}:queue", job_id)
+            except Exception as e:
+                logger.error(f"Error promoting delayed video jobs: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _recover(self):
+        # Requeue jobs whose worker died mid-run; zrem succeeds for only one process
+        redis_client = get_redis_client()
+        while True:
+            try:
+                stale = await asyncio.to_thread(
+                    redis_client.zrangebyscore, f"{self.prefix}:running", 0, time.time() - self.lease
+                )
+                for job_id in stale:
+                    if await asyncio.to_thread(redis_client.zrem, f"{self.prefix}:running", job_id):
+                        job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+                        await self._requeue(job_id, "requeued")
+                        logger.warning(f"Requeued video job {job_id} after its worker stopped")
+            except Exception as e:
+                logger.error(f"Error recovering video jobs: {str(e)}")
+            await asyncio.sleep(self.lease)
@@ -0,0 +1,265 @@
+import os
+import time
+import math
+import json
+import random
+import asyncio
+import hashlib
+import logging
+import itertools
+from types import SimpleNamespace
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Which backend Chatbot talks to: "gemini" (default) or "fake" for offline load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+GEMINI_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+
+class GeminiUploadSession:
+    # One resumable upload to the Gemini Files API (X-Goog-Upload protocol)
+    def __init__(self, client, upload_url):
+        self.client = client
+        self.upload_url = upload_url
+
+    async def send(self, data, offset, final=False):
+        # Every chunk but the last must be a multiple of 256 KiB; returns the file resource after the last one
+        response = await self.client.post(
+            self.upload_url,
+            content=data,
+            headers={
+                "X-Goog-Upload-Command": "upload, finalize" if final else "upload",
+                "X-Goog-Upload-Offset": str(offset),
+            },
+        )
+        response.raise_for_status()
+        return response.json()["file"] if final else None
+
+    async def close(self):
+        await self.client.aclose()
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, api_key=None):
+        import google.generativeai as genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("No GEMINI_API_KEY found in environment variables. Please set it in your .env file.")
+
+        # Configure the generative AI
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.api_key = api_key
+
+    def model(self, model_name, generation_config):
+        return self.genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+
+    def upload_file(self, path):
+        return self.genai.upload_file(path)
+
+    def get_file(self, name):
+        return self.genai.get_file(name)
+
+    async def start_upload(self, size, mime_type, display_name):
+        import httpx
+
+        client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+        try:
+            response = await client.post(
+                GEMINI_UPLOAD_URL,
+                json={"file": {"display_name": display_name}},
+                headers={
+                    # In a header rather than the query string, so it never shows up in error messages or logs
+                    "x-goog-api-key": self.api_key,
+                    "X-Goog-Upload-Protocol": "resumable",
+                    "X-Goog-Upload-Command": "start",
+                    "X-Goog-Upload-Header-Content-Length": str(size),
+                    "X-Goog-Upload-Header-Content-Type": mime_type,
+                },
+            )
+            response.raise_for_status()
+        except BaseException:
+            await client.aclose()
+            raise
+        return GeminiUploadSession(client, response.headers["X-Goog-Upload-URL"])
+
+def parse_distribution(spec):
+    # "fixed:0.5", "uniform:0.2:1.5" or "lognormal:<median>:<sigma>", all in seconds
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class FakeServiceError(Exception):
+    # Looks like a Gemini 503 so the resilience layer treats it as transient
+    code = 503
+
+class FakePart:
+    def __init__(self, value):
+        self.text = value if isinstance(value, str) else ""
+        self.file = None if isinstance(value, str) else value
+
+class FakeContent:
+    def __init__(self, role, parts):
+        self.role = role
+        self.parts = [part if isinstance(part, FakePart) else FakePart(part) for part in parts]
+
+def to_fake_contents(contents):
+    if isinstance(contents, (str, FakeContent, dict)) or not isinstance(contents, (list, tuple)):
+        contents = [contents]
+    if contents and not isinstance(contents[0], (FakeContent, dict)):
+        # A flat list of parts is a single user turn
+        return [FakeContent("user", contents)]
+    return [c if isinstance(c, FakeContent) else FakeContent(c.get("role", "user"), c.get("parts", [])) for c in contents]
+
+def fake_token_count(text):
+    return len(text) // 4 + 1 if text else 0
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens, chunks=None, chunk_delay=None, rng=None):
+        self.text = text
+        self.candidates = [SimpleNamespace(content=FakeContent("model", [text]))]
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=fake_token_count(text),
+            total_token_count=prompt_tokens + fake_token_count(text),
+            cached_content_token_count=0,
+        )
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+        self._rng = rng
+
+    async def __aiter__(self):
+        for chunk in self._chunks or [self.text]:
+            if self._chunk_delay:
+                await asyncio.sleep(self._chunk_delay(self._rng))
+            yield SimpleNamespace(text=chunk, usage_metadata=self.usage_metadata)
+
+def fake_instance(schema, rng, text):
+    # A value matching a response schema, with `text` for the strings
+    kind = schema["type"].upper()
+    if kind == "OBJECT":
+        return {key: fake_instance(value, rng, text) for key, value in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        return [fake_instance(schema["items"], rng, text) for _ in range(rng.randint(1, 4))]
+    if kind == "INTEGER":
+        return rng.randint(1, 10)
+    if kind == "NUMBER":
+        return rng.random()
+    if kind == "BOOLEAN":
+        return rng.random() < 0.5
+    return text
+
+class FakeModel:
+    def __init__(self, backend, model_name, generation_config):
+        self.backend = backend
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.generation_config = generation_config
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, request_options=None):
+        contents = to_fake_contents(contents)
+        config = {**self.generation_config, **(generation_config or {})}
+        return await self.backend.generate(self.model_name, contents, config, stream)
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history or [])
+
+class FakeChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = history
+
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        self._history = to_fake_contents(list(history)) if history else []
+
+    async def send_message_async(self, content, generation_config=None, stream=False):
+        message = to_fake_contents(content)[0]
+        response = await self.model.generate_content_async(self._history + [message], generation_config, stream)
+        self._history = self._history + [message, response.candidates[0].content]
+        return response
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self, latency=None, chunk_latency=None, processing_time=None, error_rate=None,
+                 response_words=None, seed=None):
+        self.latency = parse_distribution(latency or os.getenv("FAKE_LLM_LATENCY", "lognormal:1.0:0.5"))
+        self.chunk_latency = parse_distribution(chunk_latency or os.getenv("FAKE_LLM_CHUNK_LATENCY", "fixed:0.05"))
+        self.processing_time = parse_distribution(processing_time or os.getenv("FAKE_LLM_PROCESSING_TIME", "uniform:5:20"))
+        self.error_rate = float(error_rate if error_rate is not None else os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+        self.response_words = int(response_words or os.getenv("FAKE_LLM_RESPONSE_WORDS", "150"))
+        self.rng = random.Random(int(seed if seed is not None else os.getenv("FAKE_LLM_SEED", "0")))
+        self._file_ids = itertools.count(1)
+        self._files = {}
+
+    def model(self, model_name, generation_config):
+        return FakeModel(self, model_name, generation_config)
+
+    async def generate(self, model_name, contents, config, stream):
+        await asyncio.sleep(self.latency(self.rng))
+        if self.rng.random() < self.error_rate:
+            raise FakeServiceError("Simulated Gemini failure")
+
+        prompt = "\n".join(part.text for content in contents for part in content.parts)
+        prompt_tokens = fake_token_count(prompt) + 258 * sum(1 for c in contents for p in c.parts if p.file)
+        # Same prompt, same answer
+        seed = int(hashlib.sha256(f"{model_name}:{prompt}".encode()).hexdigest()[:8], 16)
+        words = min(self.response_words, int(config.get("max_output_tokens", 2048) * 0.75))
+        filler = random.Random(seed).choices(["hook", "brand", "audience", "visual", "message", "pacing", "call-to-action"], k=words)
+        text = f"[{model_name}] " + " ".join(filler)
+        if config.get("response_schema"):
+            text = json.dumps(fake_instance(config["response_schema"], random.Random(seed), text))
+        if not stream:
+            return FakeResponse(text, prompt_tokens)
+        chunks = [text[i:i + 40] for i in range(0, len(text), 40)]
+        return FakeResponse(text, prompt_tokens, chunks, self.chunk_latency, self.rng)
+
+    def upload_file(self, path):
+        size = os.path.getsize(path)
+        name = f"files/fake-{next(self._file_ids)}"
+        self._files[name] = time.monotonic() + self.processing_time(self.rng)
+        return SimpleNamespace(name=name, size_bytes=size, state=SimpleNamespace(name="PROCESSING"), uri=f"fake://{name}")
+
+    def get_file(self, name):
+        state = "ACTIVE" if time.monotonic() >= self._files[name] else "PROCESSING"
+        return SimpleNamespace(name=name, state=SimpleNamespace(name=state), uri=f"fake://{name}")
+
+    async def start_upload(self, size, mime_type, display_name):
+        await asyncio.sleep(self.latency(self.rng))
+        return FakeUploadSession(self, size)
+
+class FakeUploadSession:
+    def __init__(self, backend, size):
+        self.backend = backend
+        self.size = size
+
+    async def send(self, data, offset, final=False):
+        await asyncio.sleep(self.backend.chunk_latency(self.backend.rng))
+        if not final:
+            return None
+        name = f"files/fake-{next(self.backend._file_ids)}"
+        self.backend._files[name] = time.monotonic() + self.backend.processing_time(self.backend.rng)
+        return {"name": name, "sizeBytes": str(self.size), "state": "PROCESSING"}
+
+    async def close(self):
+        pass
+
+def create_backend(name=LLM_BACKEND):
+    if name == "fake":
+        logger.info("Using the fake LLM backend")
+        return FakeBackend()
+    return GeminiBackend()
@@ -0,0 +1,59 @@
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from chatbot import Chatbot
+from llm_backend import create_backend
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+async def simulate_user(chatbot, user_id, messages, latencies, errors):
+    for i in range(messages):
+        started = time.monotonic()
+        try:
+            await chatbot.send_message(user_id, f"Message {i} from user {user_id}: what makes a good hook?")
+            latencies.append(time.monotonic() - started)
+        except Exception as e:
+            errors.append(type(e).__name__)
+
+async def simulate_video(chatbot, user_id, video_path, latencies, errors):
+    started = time.monotonic()
+    try:
+        await chatbot.analyze_video(video_path, user_id=user_id)
+        latencies.append(time.monotonic() - started)
+    except Exception as e:
+        errors.append(type(e).__name__)
+
+async def main(args):
+    # Run against the fake backend unless told otherwise; this never touches the Gemini quota
+    chatbot = Chatbot(backend=create_backend(os.getenv("LLM_BACKEND", "fake")))
+    chat_latencies, video_latencies, errors = [], [], []
+    with tempfile.NamedTemporaryFile(suffix=".mp4") as video:
+        video.write(b"\0" * 1024)
+        video.flush()
+        started = time.monotonic()
+        tasks = [simulate_user(chatbot, f"user-{u}", args.messages, chat_latencies, errors) for u in range(args.users)]
+        tasks += [simulate_video(chatbot, f"user-{u}", video.name, video_latencies, errors) for u in range(args.videos)]
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+    print(f"Backend: {chatbot.backend.name}, wall time {elapsed:.2f}s")
+    for name, samples in (("chat", chat_latencies), ("video", video_latencies)):
+        if samples:
+            print(f"{name}: {len(samples)} ok, p50 {percentile(samples, 0.5):.2f}s, p99 {percentile(samples, 0.99):.2f}s")
+    print(f"errors: {len(errors)} {sorted(set(errors))}")
+    print(f"scheduler: {chatbot.scheduler.metrics()}")
+    print(f"resilience: {chatbot.resilience.metrics()}")
+    print(f"file watcher: {chatbot.file_watcher.metrics()}")
+    print(f"routing: {chatbot.router.metrics()['tiers']}")
+    print(f"usage: {chatbot.usage.metrics()['routes']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test of the Chatbot against the fake LLM backend")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--videos", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
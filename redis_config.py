@@ -29,6 +29,9 @@ def test_redis_connection():
 # Set TTL for chat sessions (e.g., 1 hour)
 CHAT_SESSION_TTL = 3600
 
+# TTL for cached LLM responses (e.g., 24 hours)
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 86400))
+
 # Batch size for database writes
 DB_WRITE_BATCH_SIZE = 10
 
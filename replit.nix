@@ -1,6 +1,7 @@
 {pkgs}: {
   deps = [
     pkgs.redis
+    pkgs.ffmpeg
     pkgs.zlib
     pkgs.tk
     pkgs.tcl
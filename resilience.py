@@ -0,0 +1,206 @@
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Retries for transient Gemini failures, with full-jitter exponential backoff (seconds)
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8"))
+
+# Send a duplicate of a hedgeable request if the first has not answered after this many seconds (0 disables)
+GEMINI_HEDGE_DELAY = float(os.getenv("GEMINI_HEDGE_DELAY", "0"))
+
+# Open the circuit after this many consecutive transient failures, for this many seconds
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30"))
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# API keys in request URLs that error messages quote
+API_KEY_PATTERN = re.compile(r"(key=)[^&\s'\"]+")
+
+class GeminiError(Exception):
+    status_code = 502
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class GeminiRequestError(GeminiError):
+    # The request itself was rejected (invalid input, blocked prompt, ...); retrying won't help
+    status_code = 400
+
+class VideoProcessingError(GeminiError):
+    status_code = 422
+
+class VideoExpiredError(GeminiError):
+    # The uploaded file is gone from Gemini; the video has to be uploaded again
+    status_code = 410
+
+class MalformedResponseError(GeminiError):
+    # The response didn't match the requested JSON schema (e.g. truncated at the token limit)
+    status_code = 502
+
+class GeminiUnavailableError(GeminiError):
+    status_code = 503
+
+class CircuitOpenError(GeminiUnavailableError):
+    pass
+
+def status_code(exc):
+    # google.api_core exceptions carry the HTTP status as `code`, googleapiclient errors as `resp.status`,
+    # httpx errors as `response.status_code`
+    status = getattr(exc, "code", None)
+    if not isinstance(status, int):
+        status = getattr(getattr(exc, "resp", None), "status", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+def is_transient(exc):
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    return status_code(exc) in TRANSIENT_STATUS_CODES
+
+def describe(exc):
+    # The error text with any API key in a quoted URL masked
+    return API_KEY_PATTERN.sub(r"\1<redacted>", str(exc))
+
+def classify(exc):
+    # Wrap a non-transient failure in the matching typed error
+    status = status_code(exc)
+    if status is not None and 400 <= status < 500:
+        return GeminiRequestError(f"The AI service rejected the request: {describe(exc)}")
+    return GeminiError(f"The AI service failed to process the request: {describe(exc)}")
+
+class CircuitBreaker:
+    def __init__(self, threshold=GEMINI_BREAKER_THRESHOLD, cooldown=GEMINI_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open":
+            retry_after = max(1, int(self.cooldown - (time.monotonic() - self._opened_at)))
+            raise CircuitOpenError("The AI service is temporarily unavailable, please try again shortly.", retry_after)
+        if state == "half_open":
+            # Let a single trial request through to probe recovery
+            if self._trial_running:
+                raise CircuitOpenError("The AI service is temporarily unavailable, please try again shortly.", 1)
+            self._trial_running = True
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info("Gemini circuit closed")
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_running = False
+        if self._opened_at is not None or self._failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"Gemini circuit opened after {self._failures} consecutive failures")
+            self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        # The trial ended without telling us anything about Gemini's health
+        self._trial_running = False
+
+class ResilientCaller:
+    def __init__(self, max_retries=GEMINI_MAX_RETRIES, base_delay=GEMINI_RETRY_BASE_DELAY,
+                 max_delay=GEMINI_RETRY_MAX_DELAY, hedge_delay=GEMINI_HEDGE_DELAY, breaker=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._retries = 0
+        self._hedges = 0
+
+    async def call(self, func, hedge=False, passthrough=()):
+        # `func` must be safe to repeat; `hedge` additionally allows running it twice at once
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                if hedge and self.hedge_delay > 0:
+                    result = await self._hedged(func)
+                else:
+                    result = await func()
+            except passthrough:
+                self.breaker.release_trial()
+                raise
+            except GeminiError:
+                self.breaker.release_trial()
+                raise
+            except Exception as e:
+                if not is_transient(e):
+                    self.breaker.release_trial()
+                    raise classify(e) from e
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise GeminiUnavailableError(f"The AI service is unavailable: {describe(e)}") from e
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                self._retries += 1
+                logger.warning(f"Transient Gemini error ({describe(e)}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled mid-call: free the half-open trial slot or the circuit never closes again
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def _hedged(self, func):
+        pending = {asyncio.ensure_future(func())}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if done:
+                return done.pop().result()
+
+            self._hedges += 1
+            logger.info(f"Gemini request slower than {self.hedge_delay}s, sending a hedged duplicate")
+            pending.add(asyncio.ensure_future(func()))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def metrics(self):
+        return {
+            "circuit": self.breaker.state,
+            "retries": self._retries,
+            "hedges": self._hedges,
+        }
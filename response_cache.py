@@ -0,0 +1,98 @@
+import os
+import re
+import json
+import hashlib
+import asyncio
+import logging
+from redis_config import get_redis_client, RESPONSE_CACHE_TTL
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The response cache is opt-in
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+def normalize_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt or "").strip().lower()
+
+class ResponseCache:
+    def __init__(self, enabled=RESPONSE_CACHE_ENABLED, ttl=RESPONSE_CACHE_TTL, prefix="llm_response"):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def make_key(self, kind, prompt, preamble, model_name, generation_config, video_hash=None, context=None):
+        # `context` is a digest of the conversation the prompt continues, if any
+        fields = {
+            "kind": kind,
+            "prompt": normalize_prompt(prompt),
+            "preamble": preamble,
+            "model": model_name,
+            "generation_config": generation_config,
+            "video_hash": video_hash,
+        }
+        if context:
+            fields["context"] = context
+        payload = json.dumps(fields, sort_keys=True, default=str)
+        return f"{self.prefix}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    async def get(self, key, kind):
+        redis_client = get_redis_client()
+        try:
+            value = await asyncio.to_thread(redis_client.get, key)
+        except Exception as e:
+            logger.error(f"Error reading response cache: {str(e)}")
+            return None
+        await self._count(kind, "hits" if value is not None else "misses")
+        return value.decode() if value is not None else None
+
+    async def set(self, key, value):
+        redis_client = get_redis_client()
+        try:
+            await asyncio.to_thread(redis_client.setex, key, self.ttl, value)
+        except Exception as e:
+            logger.error(f"Error writing response cache: {str(e)}")
+
+    async def _count(self, kind, outcome):
+        redis_client = get_redis_client()
+        try:
+            await asyncio.to_thread(redis_client.hincrby, f"{self.prefix}:stats", f"{kind}:{outcome}", 1)
+        except Exception as e:
+            logger.error(f"Error updating response cache stats: {str(e)}")
+
+    async def stats(self):
+        redis_client = get_redis_client()
+        try:
+            raw = await asyncio.to_thread(redis_client.hgetall, f"{self.prefix}:stats")
+        except Exception as e:
+            logger.error(f"Error reading response cache stats: {str(e)}")
+            raw = {}
+        stats = {"enabled": self.enabled}
+        for field, value in raw.items():
+            kind, outcome = field.decode().split(":", 1)
+            stats.setdefault(kind, {"hits": 0, "misses": 0})[outcome] = int(value)
+        return stats
+
+class SegmentCache:
+    # Per-segment findings, keyed by the source video's content hash, the time range and the prompt
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, prefix="video_segment"):
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def make_key(self, video_hash, start, end, prompt_key):
+        return f"{self.prefix}:{video_hash}:{start:.0f}-{end:.0f}:{prompt_key}"
+
+    async def get(self, key):
+        try:
+            value = await asyncio.to_thread(get_redis_client().get, key)
+        except Exception as e:
+            logger.error(f"Error reading segment cache: {str(e)}")
+            return None
+        return value.decode() if value is not None else None
+
+    async def set(self, key, value):
+        try:
+            await asyncio.to_thread(get_redis_client().setex, key, self.ttl, value)
+        except Exception as e:
+            logger.error(f"Error writing segment cache: {str(e)}")
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from redis_config import get_redis_client
+from uploads import UploadRejected, UploadTooLarge, MAX_UPLOAD_SIZE, check_content_type
+from temp_storage import UPLOAD_MAX_AGE
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class OffsetMismatch(UploadRejected):
+    # The client's offset disagrees with what is on disk; it should resume from `offset`
+    status_code = 409
+
+    def __init__(self, offset):
+        super().__init__(f"Upload offset mismatch, resume from byte {offset}")
+        self.offset = offset
+
+class IncompleteUpload(UploadRejected):
+    status_code = 409
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+def touch(path):
+    with open(path, "wb"):
+        pass
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResumableUploads:
+    # Upload records live in Redis as <prefix>:<id>; the bytes are appended to a spooled file.
+    # The size on disk is the authoritative offset, so a chunk cut off halfway resumes where it stopped.
+    # Between requests the partial file counts against the storage budget by its size on disk; any worker
+    # process may serve the next chunk, so nothing is held in one process's reservations.
+    # `pipeline(upload)` may return an UploadPipeline that forwards the chunks to Gemini as they are written.
+    def __init__(self, storage, ttl=UPLOAD_MAX_AGE, prefix="video_upload", pipeline=None):
+        self.storage = storage
+        self.ttl = ttl
+        self.prefix = prefix
+        self.pipeline = pipeline
+        # upload id -> (offset, running sha256) for uploads appended by this process
+        self._hashers = {}
+        self._locks = {}
+        # upload id -> UploadPipeline for uploads whose every byte this process has forwarded so far
+        self._pipelines = {}
+
+    def _key(self, upload_id):
+        return f"{self.prefix}:{upload_id}"
+
+    async def create(self, user_id, file_name, size, content_type=None, params=None):
+        if size <= 0:
+            raise UploadRejected("The uploaded video is empty")
+        if size > MAX_UPLOAD_SIZE:
+            raise UploadTooLarge(MAX_UPLOAD_SIZE)
+        check_content_type(content_type)
+        # Refuse up front if the whole video wouldn't fit right now
+        path = await self.storage.reserve(file_name, size)
+        try:
+            await asyncio.to_thread(touch, path)
+        finally:
+            self.storage.release(path)
+        upload = {
+            "id": uuid.uuid4().hex,
+            "user_id": str(user_id),
+            "file_name": file_name,
+            "size": size,
+            "content_type": content_type,
+            "path": path,
+            "params": params or {},
+            "created_at": time.time(),
+        }
+        await self._save(upload)
+        self._hashers[upload["id"]] = (0, hashlib.sha256())
+        pipeline = self.pipeline(upload) if self.pipeline is not None else None
+        if pipeline is not None:
+            pipeline.start()
+            self._pipelines[upload["id"]] = pipeline
+        logger.info(f"Created resumable upload {upload['id']} for {file_name} ({size} bytes)")
+        return upload
+
+    async def get(self, upload_id, user_id):
+        raw = await asyncio.to_thread(get_redis_client().get, self._key(upload_id))
+        upload = json.loads(raw) if raw else None
+        if upload is None or upload["user_id"] != str(user_id):
+            return None
+        return upload
+
+    async def _save(self, upload):
+        await asyncio.to_thread(get_redis_client().set, self._key(upload["id"]), json.dumps(upload), ex=self.ttl)
+
+    async def offset(self, upload):
+        return await asyncio.to_thread(file_size, upload["path"])
+
+    async def append(self, upload, offset, chunks):
+        # Appends the async iterable `chunks` at `offset`; returns the new offset
+        lock = self._locks.setdefault(upload["id"], asyncio.Lock())
+        async with lock:
+            current = await self.offset(upload)
+            if offset != current:
+                raise OffsetMismatch(current)
+            # Held only while this chunk is written
+            await self.storage.reserve(upload["file_name"], upload["size"], path=upload["path"])
+            try:
+                return await self._write(upload, current, chunks)
+            finally:
+                self.storage.release(upload["path"])
+
+    async def _write(self, upload, current, chunks):
+        hashed_offset, digest = self._hashers.get(upload["id"], (None, None))
+        if hashed_offset != current:
+            # This process didn't see the earlier bytes; finalize will hash the file from disk
+            digest = None
+        pipeline = self._pipelines.get(upload["id"])
+        if pipeline is not None and pipeline.received != current:
+            # Same for the pipeline; the finished file is uploaded the regular way instead
+            self._drop_pipeline(upload["id"])
+            pipeline = None
+        out = await asyncio.to_thread(open, upload["path"], "ab")
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if current + len(chunk) > upload["size"]:
+                    raise UploadTooLarge(upload["size"])
+                await asyncio.to_thread(out.write, chunk)
+                current += len(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                if pipeline is not None:
+                    await pipeline.feed(chunk)
+        finally:
+            await asyncio.to_thread(out.close)
+            if digest is not None:
+                self._hashers[upload["id"]] = (current, digest)
+            else:
+                self._hashers.pop(upload["id"], None)
+        # Keep the record alive while the client is still sending
+        await self._save(upload)
+        return current
+
+    async def finalize(self, upload):
+        # Returns (path, sha256 hex digest, pipelined Gemini file or None); the caller owns the file from here on
+        async with self._locks.setdefault(upload["id"], asyncio.Lock()):
+            current = await self.offset(upload)
+            if current != upload["size"]:
+                raise IncompleteUpload(f"Upload is incomplete: {current} of {upload['size']} bytes received")
+            hashed_offset, digest = self._hashers.pop(upload["id"], (None, None))
+            video_hash = digest.hexdigest() if hashed_offset == current else await asyncio.to_thread(hash_file, upload["path"])
+            pipeline = self._pipelines.pop(upload["id"], None)
+            if pipeline is not None and pipeline.received != current:
+                pipeline.cancel()
+                pipeline = None
+            await self._forget(upload)
+        remote_file = None
+        if pipeline is not None:
+            await pipeline.end()
+            remote_file = await pipeline.result()
+        logger.info(f"Finalized resumable upload {upload['id']}")
+        return upload["path"], video_hash, remote_file
+
+    async def abort(self, upload):
+        await self._forget(upload)
+        await asyncio.to_thread(self.storage.remove, upload["path"])
+
+    async def _forget(self, upload):
+        self._hashers.pop(upload["id"], None)
+        self._locks.pop(upload["id"], None)
+        self._drop_pipeline(upload["id"])
+        await asyncio.to_thread(get_redis_client().delete, self._key(upload["id"]))
+
+    def _drop_pipeline(self, upload_id):
+        pipeline = self._pipelines.pop(upload_id, None)
+        if pipeline is not None:
+            pipeline.cancel()
+
+    async def reap(self):
+        # Drops in-memory state of uploads whose record expired; their files are reaped by age like any orphan.
+        # The ids are read and dropped on the event loop; only the Redis lookups run in a thread
+        upload_ids = list(self._hashers.keys() | self._locks.keys() | self._pipelines.keys())
+        expired = await asyncio.to_thread(self._expired, upload_ids)
+        for upload_id in expired:
+            lock = self._locks.get(upload_id)
+            if lock is not None and lock.locked():
+                continue
+            self._hashers.pop(upload_id, None)
+            self._locks.pop(upload_id, None)
+            self._drop_pipeline(upload_id)
+
+    def _expired(self, upload_ids):
+        redis_client = get_redis_client()
+        return [upload_id for upload_id in upload_ids if not redis_client.exists(self._key(upload_id))]
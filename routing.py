@@ -0,0 +1,80 @@
+import os
+import logging
+from collections import defaultdict, deque
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GEMINI_PRO_MODEL = os.getenv("GEMINI_PRO_MODEL", "gemini-1.5-pro-latest")
+GEMINI_FLASH_MODEL = os.getenv("GEMINI_FLASH_MODEL", "gemini-1.5-flash-latest")
+
+# Chat messages up to this many characters (without video or deep flag) go to the light route
+LIGHT_CHAT_MAX_CHARS = int(os.getenv("LIGHT_CHAT_MAX_CHARS", "280"))
+
+# All per-route model and output settings live here
+MODEL_ROUTES = {
+    "chat_light": {"model": GEMINI_FLASH_MODEL, "max_output_tokens": 512},
+    "chat": {"model": GEMINI_PRO_MODEL, "max_output_tokens": 2048},
+    "video": {"model": GEMINI_PRO_MODEL, "max_output_tokens": 2048},
+    "deep_analysis": {"model": GEMINI_PRO_MODEL, "max_output_tokens": 8192},
+    "summary": {"model": GEMINI_FLASH_MODEL, "max_output_tokens": 512},
+}
+
+def choose_route(prompt, has_video=False, deep=False):
+    if deep:
+        return "deep_analysis"
+    if has_video:
+        return "video"
+    if len((prompt or "").strip()) <= LIGHT_CHAT_MAX_CHARS:
+        return "chat_light"
+    return "chat"
+
+class ModelRouter:
+    def __init__(self, backend, generation_config, routes=MODEL_ROUTES):
+        self.backend = backend
+        self.routes = routes
+        self.generation_config = generation_config
+        self._models = {}
+        self._decisions = defaultdict(int)
+        self._latencies = defaultdict(lambda: deque(maxlen=1000))
+
+    def route(self, prompt, has_video=False, deep=False):
+        name = choose_route(prompt, has_video, deep)
+        self._decisions[name] += 1
+        logger.info(f"Routing request to {name} ({self.routes[name]['model']})")
+        return name
+
+    def model_name(self, route):
+        return self.routes[route]["model"]
+
+    def generation_config_for(self, route):
+        return {**self.generation_config, "max_output_tokens": self.routes[route]["max_output_tokens"]}
+
+    def model(self, route):
+        # One GenerativeModel per tier, shared by every route that uses it
+        name = self.model_name(route)
+        if name not in self._models:
+            self._models[name] = self.backend.model(name, self.generation_config)
+        return self._models[name]
+
+    def record(self, route, seconds):
+        self._latencies[("route", route)].append(seconds)
+        self._latencies[("tier", self.model_name(route))].append(seconds)
+
+    def metrics(self):
+        def summarize(samples):
+            ordered = sorted(samples)
+            if not ordered:
+                return {"count": 0}
+            return {
+                "count": len(ordered),
+                "p50": round(ordered[int(len(ordered) * 0.5)], 3),
+                "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+            }
+
+        return {
+            "decisions": dict(self._decisions),
+            "routes": {name: summarize(samples) for (kind, name), samples in self._latencies.items() if kind == "route"},
+            "tiers": {name: summarize(samples) for (kind, name), samples in self._latencies.items() if kind == "tier"},
+        }
@@ -0,0 +1,152 @@
+import os
+import time
+import math
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Outbound Gemini calls allowed at once per worker
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+# Longest a request may wait for a slot before it is turned away (seconds)
+GEMINI_MAX_QUEUE_WAIT = float(os.getenv("GEMINI_MAX_QUEUE_WAIT", "15"))
+
+# Queue limits: overall and per user
+GEMINI_MAX_QUEUE_SIZE = int(os.getenv("GEMINI_MAX_QUEUE_SIZE", "100"))
+GEMINI_MAX_QUEUED_PER_USER = int(os.getenv("GEMINI_MAX_QUEUED_PER_USER", "10"))
+
+class SchedulerSaturated(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many pending requests, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class FairScheduler:
+    def __init__(self, max_concurrency=GEMINI_MAX_CONCURRENCY, max_queue_wait=GEMINI_MAX_QUEUE_WAIT,
+                 max_queue_size=GEMINI_MAX_QUEUE_SIZE, max_queued_per_user=GEMINI_MAX_QUEUED_PER_USER):
+        self.max_concurrency = max_concurrency
+        self.max_queue_wait = max_queue_wait
+        self.max_queue_size = max_queue_size
+        self.max_queued_per_user = max_queued_per_user
+        self._active = 0
+        # user id -> waiting futures; users are served round-robin in insertion order
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._service_time = 1.0
+        self._waits = deque(maxlen=1000)
+        self._admitted = 0
+        self._rejected = 0
+
+    def retry_after(self):
+        # Rough time until the current backlog drains
+        backlog = (self._queued + 1) * self._service_time / self.max_concurrency
+        return max(1, math.ceil(backlog))
+
+    def admit(self, user_id):
+        # Fail fast, before any work starts, when this request could not even be queued
+        if self._active < self.max_concurrency and not self._queued:
+            return
+        queue = self._queues.get(str(user_id), ())
+        if self._queued >= self.max_queue_size or len(queue) >= self.max_queued_per_user:
+            self._rejected += 1
+            raise SchedulerSaturated(self.retry_after())
+
+    async def acquire(self, user_id):
+        started = time.monotonic()
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            self._record_wait(0.0)
+            return
+
+        self.admit(user_id)
+        key = str(user_id)
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        self._queued += 1
+        try:
+            await asyncio.wait({future}, timeout=self.max_queue_wait)
+        except asyncio.CancelledError:
+            if not self._withdraw(key, future):
+                # A slot was handed over just as we were cancelled; give it back
+                self.release()
+            raise
+        if not future.done():
+            self._withdraw(key, future)
+            self._rejected += 1
+            logger.warning(f"Gemini request for user {key} timed out after {self.max_queue_wait}s in queue")
+            raise SchedulerSaturated(self.retry_after())
+        self._record_wait(time.monotonic() - started)
+
+    def release(self):
+        self._active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id):
+        await self.acquire(user_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            # Exponentially weighted average of how long a call holds its slot
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self.release()
+
+    async def run(self, user_id, func):
+        async with self.slot(user_id):
+            return await func()
+
+    def _dispatch(self):
+        while self._active < self.max_concurrency and self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if future.done():
+                continue
+            self._active += 1
+            future.set_result(None)
+
+    def _withdraw(self, key, future):
+        # Returns False if the future had already been granted a slot
+        queue = self._queues.get(key)
+        if queue is None or future not in queue:
+            return False
+        queue.remove(future)
+        self._queued -= 1
+        if not queue:
+            del self._queues[key]
+        future.cancel()
+        return True
+
+    def _record_wait(self, seconds):
+        self._admitted += 1
+        self._waits.append(seconds)
+
+    def metrics(self):
+        waits = sorted(self._waits)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 3) if waits else 0.0
+
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queued,
+            "queued_users": len(self._queues),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "wait_seconds": {
+                "p50": percentile(0.5),
+                "p99": percentile(0.99),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+            "avg_service_seconds": round(self._service_time, 3),
+        }
@@ -0,0 +1,68 @@
+import os
+import shutil
+import asyncio
+import logging
+from resilience import VideoProcessingError
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Length of each analyzed segment (seconds)
+VIDEO_SEGMENT_SECONDS = int(os.getenv("VIDEO_SEGMENT_SECONDS", "300"))
+
+# Segments analyzed at once for one video
+VIDEO_SEGMENT_CONCURRENCY = int(os.getenv("VIDEO_SEGMENT_CONCURRENCY", "3"))
+
+# Videos at least this long are split even when the client didn't ask (seconds, 0 disables)
+SEGMENTED_ANALYSIS_AUTO_DURATION = float(os.getenv("SEGMENTED_ANALYSIS_AUTO_DURATION", "1200"))
+
+FFMPEG = shutil.which("ffmpeg")
+if FFMPEG is None:
+    logger.warning("ffmpeg not found; long videos will be analyzed whole instead of in segments")
+
+def segmenting_unavailable(duration):
+    # Why a video can't be split, as a notice for the user, or None if it can
+    if FFMPEG is None:
+        return "Segmented analysis is not available on this server, so the video was analyzed whole."
+    if duration is None:
+        return "The video's length could not be read, so it was analyzed whole instead of in segments."
+    return None
+
+def should_segment(duration, requested=False):
+    # Splitting needs ffmpeg and a known duration longer than one segment
+    unavailable = segmenting_unavailable(duration)
+    if unavailable or duration <= VIDEO_SEGMENT_SECONDS:
+        if requested:
+            logger.warning(f"Segmented analysis requested but not used: {unavailable or 'the video fits in one segment'}")
+        return False
+    return requested or (SEGMENTED_ANALYSIS_AUTO_DURATION > 0 and duration >= SEGMENTED_ANALYSIS_AUTO_DURATION)
+
+def plan_segments(duration, segment_seconds=VIDEO_SEGMENT_SECONDS):
+    segments = []
+    start = 0.0
+    while start < duration:
+        end = min(duration, start + segment_seconds)
+        # Fold a very short tail into the previous segment
+        if segments and end - start < segment_seconds / 4:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+        start = end
+    return segments
+
+def timestamp(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+async def cut_segment(path, start, end, out_path):
+    # Stream copy without re-encoding; cuts land on the nearest keyframe, which is fine for analysis
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG, "-v", "error", "-y", "-ss", f"{start:.3f}", "-i", path, "-t", f"{end - start:.3f}",
+        "-c", "copy", "-avoid_negative_ts", "make_zero", out_path,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise VideoProcessingError(f"ffmpeg failed to cut {timestamp(start)}-{timestamp(end)}: {stderr.decode(errors='replace').strip()}")
@@ -0,0 +1,84 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum number of live chat sessions kept in memory per worker
+SESSION_POOL_MAX_SIZE = int(os.getenv("SESSION_POOL_MAX_SIZE", "500"))
+
+# Idle time (seconds) after which a user's session is dropped from the pool
+SESSION_POOL_IDLE_TTL = int(os.getenv("SESSION_POOL_IDLE_TTL", "1800"))
+
+class ChatSessionPool:
+    def __init__(self, max_size=SESSION_POOL_MAX_SIZE, idle_ttl=SESSION_POOL_IDLE_TTL):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        # Per-user asyncio locks, kept apart from the sessions so one exists before the first session is stored
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id):
+        with self._lock:
+            self._evict_expired()
+            return str(user_id) in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def get(self, user_id):
+        key = str(user_id)
+        with self._lock:
+            self._evict_expired()
+            entry = self._sessions.get(key)
+            if entry is None:
+                return None
+            # Mark as most recently used
+            self._sessions.move_to_end(key)
+            entry[1] = time.monotonic()
+            return entry[0]
+
+    def lock(self, user_id):
+        # Per-user lock so concurrent turns don't interleave in one chat history; every caller gets the same one
+        with self._lock:
+            return self._locks.setdefault(str(user_id), asyncio.Lock())
+
+    def put(self, user_id, session):
+        key = str(user_id)
+        with self._lock:
+            self._sessions[key] = [session, time.monotonic()]
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                evicted_key, _ = self._sessions.popitem(last=False)
+                self._drop_lock(evicted_key)
+                logger.info(f"Evicted chat session for user {evicted_key} (pool full)")
+
+    def discard(self, user_id):
+        key = str(user_id)
+        with self._lock:
+            if self._sessions.pop(key, None) is not None:
+                self._drop_lock(key)
+
+    def _drop_lock(self, key):
+        # A held lock stays, so its holder and waiters keep excluding the user's next turn
+        lock = self._locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._locks[key]
+
+    def _evict_expired(self):
+        # Entries are ordered by last use, so expired ones are always at the front
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            key, (_, last_used) = next(iter(self._sessions.items()))
+            if last_used >= cutoff:
+                break
+            del self._sessions[key]
+            self._drop_lock(key)
+            logger.info(f"Evicted idle chat session for user {key}")
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from redis_config import get_redis_client
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Also coalesce identical requests across workers through Redis
+SINGLEFLIGHT_DISTRIBUTED = os.getenv("SINGLEFLIGHT_DISTRIBUTED", "false").lower() in ("1", "true", "yes")
+
+# How long a worker may hold the cross-worker lock (seconds); should exceed the slowest call
+SINGLEFLIGHT_LOCK_TTL = int(os.getenv("SINGLEFLIGHT_LOCK_TTL", "600"))
+
+# How long the leader's result stays readable for waiting workers (seconds)
+SINGLEFLIGHT_RESULT_TTL = int(os.getenv("SINGLEFLIGHT_RESULT_TTL", "30"))
+
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", "0.5"))
+
+class SingleFlight:
+    def __init__(self, distributed=SINGLEFLIGHT_DISTRIBUTED, lock_ttl=SINGLEFLIGHT_LOCK_TTL,
+                 result_ttl=SINGLEFLIGHT_RESULT_TTL, poll_interval=SINGLEFLIGHT_POLL_INTERVAL):
+        self.distributed = distributed
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._inflight = {}
+
+    def join(self, key):
+        # Future of an identical call already running in this worker, if any
+        return self._inflight.get(key)
+
+    def begin(self, key):
+        future = asyncio.get_running_loop().create_future()
+        # Followers may all be gone by the time the leader fails; don't warn about it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return future
+
+    def finish(self, key, future, result=None, error=None):
+        # Settles the flight `begin` returned; a newer flight under the same key is left alone
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def do(self, key, func):
+        future = self.join(key)
+        if future is not None:
+            logger.info(f"Joined in-flight request {key}")
+            return await asyncio.shield(future)
+
+        future = self.begin(key)
+        try:
+            if self.distributed:
+                result = await self._do_distributed(key, func)
+            else:
+                result = await func()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    async def _do_distributed(self, key, func):
+        redis_client = get_redis_client()
+        lock_key = f"singleflight:lock:{key}"
+        result_key = f"singleflight:result:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await asyncio.to_thread(redis_client.set, lock_key, token, nx=True, ex=self.lock_ttl)
+        except Exception as e:
+            logger.error(f"Error acquiring single-flight lock: {str(e)}")
+            return await func()
+
+        if acquired:
+            try:
+                # Never hand a previous run's result to this run's followers
+                await asyncio.to_thread(redis_client.delete, result_key)
+                result = await func()
+                await asyncio.to_thread(redis_client.setex, result_key, self.result_ttl, json.dumps(result))
+                return result
+            finally:
+                try:
+                    if await asyncio.to_thread(redis_client.get, lock_key) == token.encode():
+                        await asyncio.to_thread(redis_client.delete, lock_key)
+                except Exception as e:
+                    logger.error(f"Error releasing single-flight lock: {str(e)}")
+
+        # Another worker is running the same request; wait for its result
+        logger.info(f"Waiting on request {key} running in another worker")
+        deadline = time.monotonic() + self.lock_ttl
+        try:
+            while time.monotonic() < deadline:
+                value = await asyncio.to_thread(redis_client.get, result_key)
+                if value is not None:
+                    return json.loads(value)
+                if not await asyncio.to_thread(redis_client.exists, lock_key):
+                    # The leader gave up without a result
+                    break
+                await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            logger.error(f"Error waiting on single-flight result: {str(e)}")
+        return await func()
@@ -0,0 +1,131 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from uploads import UploadRejected, MAX_UPLOAD_SIZE
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Where uploads wait for analysis; point this at a tmpfs or a dedicated volume
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "temp")
+
+# Most bytes the spool directory may hold, including uploads still being written
+UPLOAD_DISK_BUDGET = int(os.getenv("UPLOAD_DISK_BUDGET", str(20 * 1024 * 1024 * 1024)))
+
+# Always leave this much free space on the spool's filesystem
+UPLOAD_MIN_FREE_BYTES = int(os.getenv("UPLOAD_MIN_FREE_BYTES", str(1024 * 1024 * 1024)))
+
+# Spooled files older than this are orphans and get reaped (seconds)
+UPLOAD_MAX_AGE = int(os.getenv("UPLOAD_MAX_AGE", "86400"))
+
+# How often the reaper runs (seconds)
+UPLOAD_REAP_INTERVAL = int(os.getenv("UPLOAD_REAP_INTERVAL", "600"))
+
+class StorageFull(UploadRejected):
+    status_code = 507
+
+def safe_name(filename):
+    return re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(filename or "upload"))[-100:] or "upload"
+
+class TempStorage:
+    def __init__(self, directory=UPLOAD_SPOOL_DIR, budget=UPLOAD_DISK_BUDGET, min_free=UPLOAD_MIN_FREE_BYTES,
+                 max_age=UPLOAD_MAX_AGE):
+        self.directory = directory
+        self.budget = budget
+        self.min_free = min_free
+        self.max_age = max_age
+        # path -> bytes reserved for uploads still being written
+        self._reserved = {}
+        self._reaped = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, filename):
+        # Unique per upload, so equal file names never collide
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}_{safe_name(filename)}")
+
+    def usage(self, reserved):
+        # Runs in a thread; `reserved` is a snapshot of the reservations taken on the event loop, which keeps changing them
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and entry.path not in reserved:
+                    total += entry.stat(follow_symlinks=False).st_size
+        return total + sum(reserved.values())
+
+    def _check_budget(self, reserved):
+        # Reservations are counted before checking, so concurrent uploads can't overcommit
+        if self.usage(reserved) > self.budget:
+            raise StorageFull("Upload storage is full, please try again later")
+        if shutil.disk_usage(self.directory).free - sum(reserved.values()) < self.min_free:
+            raise StorageFull("Not enough disk space for this upload, please try again later")
+
+    async def reserve(self, filename, expected_size=None, path=None):
+        # Returns a fresh path (or re-reserves `path`) with `expected_size` bytes held against the budget
+        if path in self._reserved:
+            return path
+        path = path or self.path_for(filename)
+        self._reserved[path] = expected_size or MAX_UPLOAD_SIZE
+        try:
+            await asyncio.to_thread(self._check_budget, dict(self._reserved))
+        except BaseException:
+            self._reserved.pop(path, None)
+            raise
+        return path
+
+    def release(self, path):
+        # The file now counts by its size on disk
+        self._reserved.pop(path, None)
+
+    @asynccontextmanager
+    async def spool(self, filename, expected_size=None):
+        # Yields a reserved path. The file is removed if the block fails; on success the caller owns it and must remove() it.
+        path = await self.reserve(filename, expected_size)
+        try:
+            yield path
+        except BaseException:
+            await asyncio.to_thread(self.remove, path)
+            raise
+        finally:
+            self.release(path)
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to remove spooled file {path}: {str(e)}")
+
+    async def reap(self):
+        # The directory scan runs in a thread against a snapshot taken here, on the loop
+        reaped = await asyncio.to_thread(self._reap, set(self._reserved))
+        self._reaped += reaped
+
+    def _reap(self, reserved):
+        cutoff = time.time() - self.max_age
+        reaped = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.path in reserved or not entry.is_file(follow_symlinks=False):
+                    continue
+                if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    self.remove(entry.path)
+                    reaped += 1
+                    logger.warning(f"Reaped orphaned upload {entry.path}")
+        return reaped
+
+    async def metrics(self):
+        reserved = dict(self._reserved)
+        return {
+            "directory": self.directory,
+            "used_bytes": await asyncio.to_thread(self.usage, reserved),
+            "budget_bytes": self.budget,
+            "uploads_in_progress": len(reserved),
+            "reaped": self._reaped,
+        }
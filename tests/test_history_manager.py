@@ -0,0 +1,77 @@
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_manager import ConversationWindow, SUMMARY_PREFIX, content_text, estimate_tokens
+
+def turn(role, text):
+    return SimpleNamespace(role=role, parts=[SimpleNamespace(text=text)])
+
+def conversation(pairs, size=200):
+    turns = []
+    for index in range(pairs):
+        turns.append(turn("user", f"question {index} " + "q" * size))
+        turns.append(turn("model", f"answer {index} " + "a" * size))
+    return turns
+
+class SummaryModel:
+    def __init__(self, summary="The user asked about hooks and pacing."):
+        self.summary = summary
+        self.prompts = []
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=self.summary)
+
+def window_tokens(window, history):
+    return sum(estimate_tokens(content_text(t)) for t in history[window.preamble_length:])
+
+def test_compaction_brings_the_history_under_budget():
+    async def scenario():
+        preamble = [turn("user", "preamble " + "p" * 2000), turn("model", "ok")]
+        window = ConversationWindow(SummaryModel(), len(preamble), token_budget=500, target_ratio=0.5)
+        session = SimpleNamespace(history=preamble + conversation(10))
+        assert window_tokens(window, session.history) > window.token_budget
+
+        summary, kept_parts, _ = await window.compact(session, asyncio.Lock())
+
+        assert session.history[:len(preamble)] == preamble
+        assert content_text(session.history[len(preamble)]).startswith(SUMMARY_PREFIX)
+        assert summary in content_text(session.history[len(preamble)])
+        assert window_tokens(window, session.history) <= window.token_budget
+        kept = session.history[len(preamble) + 2:]
+        assert kept_parts == len(kept)
+        assert kept[0].role == "user"
+        assert content_text(kept[-1]).startswith("answer 9")
+
+    asyncio.run(scenario())
+
+def test_repeated_compaction_stays_under_budget():
+    async def scenario():
+        model = SummaryModel()
+        window = ConversationWindow(model, 0, token_budget=500, target_ratio=0.5)
+        session = SimpleNamespace(history=[])
+        lock = asyncio.Lock()
+        for _ in range(30):
+            session.history += conversation(1)
+            await window.compact(session, lock)
+            assert window_tokens(window, session.history) <= window.token_budget
+        # Later summaries fold in the earlier one
+        assert any(model.summary in prompt for prompt in model.prompts[1:])
+
+    asyncio.run(scenario())
+
+def test_history_within_budget_is_left_alone():
+    async def scenario():
+        model = SummaryModel()
+        window = ConversationWindow(model, 0, token_budget=500)
+        history = conversation(2)
+        session = SimpleNamespace(history=list(history))
+        assert await window.compact(session, asyncio.Lock()) is None
+        assert session.history == history
+        assert model.prompts == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import os
+import sys
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import CircuitBreaker, CircuitOpenError, GeminiRequestError, GeminiUnavailableError, ResilientCaller
+
+def half_open_caller():
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    return ResilientCaller(max_retries=0, breaker=breaker)
+
+def test_cancelled_half_open_trial_frees_the_circuit():
+    async def scenario():
+        caller = half_open_caller()
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(3600)
+
+        trial = asyncio.ensure_future(caller.call(hang))
+        await started.wait()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        async def ok():
+            return "ok"
+
+        assert await caller.call(ok) == "ok"
+        assert caller.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+def test_half_open_admits_a_single_trial():
+    async def scenario():
+        caller = half_open_caller()
+        release = asyncio.Event()
+
+        async def wait():
+            await release.wait()
+            return "ok"
+
+        trial = asyncio.ensure_future(caller.call(wait))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await caller.call(wait)
+        release.set()
+        assert await trial == "ok"
+
+    asyncio.run(scenario())
+
+def upload_error(status, url="https://generativelanguage.googleapis.com/upload/v1beta/files?key=secret-key"):
+    httpx = pytest.importorskip("httpx")
+    request = httpx.Request("POST", url)
+    response = httpx.Response(status, request=request)
+    return httpx.HTTPStatusError(f"Server error '{status}' for url '{url}'", request=request, response=response)
+
+def test_httpx_status_errors_are_retried_and_redacted():
+    async def scenario():
+        caller = ResilientCaller(max_retries=1, base_delay=0, breaker=CircuitBreaker(threshold=10))
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise upload_error(503)
+            return "ok"
+
+        assert await caller.call(flaky) == "ok"
+        assert len(calls) == 2
+
+        async def unavailable():
+            raise upload_error(429)
+
+        with pytest.raises(GeminiUnavailableError) as unavailable_error:
+            await caller.call(unavailable)
+        assert "secret-key" not in str(unavailable_error.value)
+
+        async def rejected():
+            raise upload_error(400)
+
+        with pytest.raises(GeminiRequestError) as rejected_error:
+            await caller.call(rejected)
+        assert "secret-key" not in str(rejected_error.value)
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import os
+import sys
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from temp_storage import TempStorage
+from resumable_uploads import ResumableUploads, OffsetMismatch
+
+class InMemoryUploads(ResumableUploads):
+    # Keeps the upload records in a dict instead of Redis
+    def __init__(self, storage):
+        super().__init__(storage)
+        self.records = {}
+
+    async def _save(self, upload):
+        self.records[upload["id"]] = dict(upload)
+
+    async def get(self, upload_id, user_id):
+        upload = self.records.get(upload_id)
+        if upload is None or upload["user_id"] != str(user_id):
+            return None
+        return upload
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+def test_append_at_a_wrong_offset_is_a_409(tmp_path):
+    async def scenario():
+        uploads = InMemoryUploads(TempStorage(directory=str(tmp_path), min_free=0))
+        upload = await uploads.create("user", "video.mp4", 10, content_type="video/mp4")
+        assert await uploads.append(upload, 0, chunks(b"abcd")) == 4
+
+        for offset in (0, 8):
+            with pytest.raises(OffsetMismatch) as mismatch:
+                await uploads.append(upload, offset, chunks(b"efgh"))
+            assert mismatch.value.status_code == 409
+            assert mismatch.value.offset == 4
+
+        # The rejected chunks left the file untouched; resuming from the reported offset works
+        assert await uploads.append(upload, 4, chunks(b"efgh", b"ij")) == 10
+        with open(upload["path"], "rb") as f:
+            assert f.read() == b"abcdefghij"
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import os
+import sys
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import FairScheduler, SchedulerSaturated
+
+def test_queued_users_are_served_round_robin():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, max_queue_wait=5)
+        order = []
+
+        async def request(user_id):
+            async with scheduler.slot(user_id):
+                order.append(user_id)
+
+        await scheduler.acquire("busy")
+        tasks = [asyncio.ensure_future(request(user_id)) for user_id in ("a", "a", "a", "b")]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "a", "a"]
+
+    asyncio.run(scenario())
+
+def test_full_user_queue_is_rejected_with_retry_after():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, max_queue_wait=5, max_queued_per_user=1)
+        await scheduler.acquire("busy")
+        waiting = asyncio.ensure_future(scheduler.acquire("a"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(SchedulerSaturated) as saturated:
+            await scheduler.acquire("a")
+        assert saturated.value.retry_after >= 1
+        # Another user still gets a place in the queue
+        scheduler.admit("b")
+
+        scheduler.release()
+        await waiting
+        scheduler.release()
+
+    asyncio.run(scenario())
+
+def test_queue_wait_timeout_is_saturation():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, max_queue_wait=0.01)
+        await scheduler.acquire("busy")
+        with pytest.raises(SchedulerSaturated):
+            await scheduler.acquire("a")
+        metrics = scheduler.metrics()
+        assert metrics["queue_depth"] == 0
+        assert metrics["rejected"] == 1
+
+    asyncio.run(scenario())
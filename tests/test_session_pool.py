@@ -0,0 +1,44 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_pool import ChatSessionPool
+
+def test_lock_is_shared_before_the_first_session():
+    pool = ChatSessionPool()
+    assert pool.lock("user") is pool.lock("user")
+    lock = pool.lock("user")
+    pool.put("user", object())
+    assert pool.lock("user") is lock
+
+def test_first_turns_for_a_user_exclude_each_other():
+    async def scenario():
+        pool = ChatSessionPool()
+        inside = 0
+        overlapped = False
+
+        async def turn():
+            nonlocal inside, overlapped
+            async with pool.lock("user"):
+                inside += 1
+                overlapped = overlapped or inside > 1
+                await asyncio.sleep(0.01)
+                inside -= 1
+
+        await asyncio.gather(turn(), turn())
+        assert not overlapped
+
+    asyncio.run(scenario())
+
+def test_discarding_a_session_keeps_a_held_lock():
+    async def scenario():
+        pool = ChatSessionPool()
+        pool.put("user", object())
+        async with pool.lock("user"):
+            lock = pool.lock("user")
+            pool.discard("user")
+            assert pool.lock("user") is lock
+
+    asyncio.run(scenario())
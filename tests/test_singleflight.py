@@ -0,0 +1,75 @@
+import os
+import sys
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from singleflight import SingleFlight
+
+def test_followers_share_the_leaders_result():
+    async def scenario():
+        flight = SingleFlight(distributed=False)
+        release = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return {"answer": 42}
+
+        leader = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(leader, *followers)
+        assert calls == [1]
+        assert all(result is results[0] for result in results)
+        # The flight is over; the next call runs again
+        await flight.do("key", work)
+        assert calls == [1, 1]
+
+    asyncio.run(scenario())
+
+def test_followers_share_the_leaders_error():
+    async def scenario():
+        flight = SingleFlight(distributed=False)
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise ValueError("boom")
+
+        leader = asyncio.ensure_future(flight.do("key", fail))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", fail))
+        await asyncio.sleep(0)
+        release.set()
+        for task in (leader, follower):
+            with pytest.raises(ValueError, match="boom"):
+                await task
+
+    asyncio.run(scenario())
+
+def test_cancelled_follower_leaves_the_leader_running():
+    async def scenario():
+        flight = SingleFlight(distributed=False)
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        release.set()
+        assert await leader == "done"
+
+    asyncio.run(scenario())
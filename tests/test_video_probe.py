@@ -0,0 +1,96 @@
+import os
+import sys
+import struct
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uploads import UploadRejected, UnsupportedMediaType
+from video_probe import sniff, probe_video, video_format, VideoTooLong
+
+def box(box_type, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+def mvhd(timescale=1000, duration=30000):
+    return box(b"mvhd", b"\x00" * 12 + struct.pack(">II", timescale, duration) + b"\x00" * 80)
+
+def tkhd(width=1920, height=1080):
+    return box(b"tkhd", b"\x00" * 76 + struct.pack(">II", width << 16, height << 16))
+
+def video_trak(codec=b"avc1"):
+    hdlr = box(b"hdlr", b"\x00" * 8 + b"vide" + b"\x00" * 12)
+    stsd = box(b"stsd", b"\x00" * 8 + struct.pack(">I", 16) + codec + b"\x00" * 8)
+    minf = box(b"minf", box(b"stbl", stsd))
+    return box(b"trak", tkhd() + box(b"mdia", hdlr + minf))
+
+def mp4(moov_payload, moov_last=False):
+    ftyp = box(b"ftyp", b"isom" + b"\x00" * 4)
+    mdat = box(b"mdat", b"\x00" * 64)
+    moov = box(b"moov", moov_payload)
+    return ftyp + (mdat + moov if moov_last else moov + mdat)
+
+@pytest.fixture
+def write_video(tmp_path):
+    def write(data, name="video.mp4"):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+@pytest.mark.parametrize("moov_last", [False, True])
+def test_probe_mp4(write_video, moov_last):
+    info = probe_video(write_video(mp4(mvhd() + video_trak(), moov_last)))
+    assert info == {"container": "mp4", "duration": 30.0, "codec": "avc1", "width": 1920, "height": 1080}
+    assert video_format(info) == "mp4/avc1 1920x1080"
+
+def test_probe_rejects_long_video(write_video):
+    with pytest.raises(VideoTooLong):
+        probe_video(write_video(mp4(mvhd(duration=7200 * 1000))), max_duration=3600)
+
+def test_probe_rejects_missing_moov(write_video):
+    with pytest.raises(UploadRejected, match="corrupt"):
+        probe_video(write_video(box(b"ftyp", b"isom" + b"\x00" * 4) + box(b"mdat", b"\x00" * 64)))
+
+def test_probe_rejects_empty_mvhd(write_video):
+    with pytest.raises(UploadRejected, match="corrupt"):
+        probe_video(write_video(mp4(box(b"mvhd"))))
+
+def test_probe_rejects_short_tkhd(write_video):
+    trak = box(b"trak", box(b"tkhd", b"\x00" * 12) + box(b"mdia", box(b"hdlr", b"\x00" * 8 + b"vide" + b"\x00" * 12)))
+    with pytest.raises(UploadRejected, match="corrupt"):
+        probe_video(write_video(mp4(mvhd() + trak)))
+
+def test_probe_rejects_truncated_file(write_video):
+    data = mp4(mvhd() + video_trak(), moov_last=True)
+    with pytest.raises(UploadRejected, match="corrupt"):
+        probe_video(write_video(data[:-40]))
+
+def test_probe_webm(write_video):
+    # EBML header, then a Segment with Info (TimecodeScale, Duration as float64) and one video TrackEntry
+    ebml = b"\x1a\x45\xdf\xa3\x84" + b"\x42\x86\x81\x01"
+    info = b"\x2a\xd7\xb1\x83\x0f\x42\x40" + b"\x44\x89\x88" + struct.pack(">d", 12500.0)
+    track = b"\x83\x81\x01" + b"\x86\x85V_VP9" + b"\xe0\x88" + b"\xb0\x82\x05\x00" + b"\xba\x82\x02\xd0"
+    segment = b"\x15\x49\xa9\x66" + bytes([0x80 | len(info)]) + info
+    segment += b"\x16\x54\xae\x6b" + bytes([0x80 | len(track) + 2]) + b"\xae" + bytes([0x80 | len(track)]) + track
+    data = ebml + b"\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff" + segment + b"\x00" * 16
+    info = probe_video(write_video(data, "video.webm"))
+    assert info == {"container": "webm", "duration": 12.5, "codec": "V_VP9", "width": 1280, "height": 720}
+
+def test_probe_truncated_webm_keeps_what_it_found(write_video):
+    ebml = b"\x1a\x45\xdf\xa3\x84" + b"\x42\x86\x81\x01"
+    info = probe_video(write_video(ebml + b"\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff\x15\x49", "video.webm"))
+    assert info == {"container": "webm"}
+
+@pytest.mark.parametrize("head, container", [
+    (b"\x00\x00\x00\x18ftypqt  ", "mov"),
+    (b"\x00\x00\x00\x18ftyp3gp4", "3gp"),
+    (b"RIFF\x00\x00\x00\x00AVI ", "avi"),
+    (b"\x47" + b"\x00" * 187 + b"\x47", "mpegts"),
+])
+def test_sniff(head, container):
+    assert sniff(head) == container
+
+@pytest.mark.parametrize("head", [b"GIF89a" + b"\x00" * 200, b"\x89PNG\r\n", b"hello world"])
+def test_sniff_rejects_non_video(head):
+    with pytest.raises(UnsupportedMediaType):
+        sniff(head)
@@ -18,7 +18,15 @@ def update_schema():
         "ALTER TABLE user_chat_history DROP CONSTRAINT IF EXISTS user_chat_history_user_id_fkey;",
         "ALTER TABLE user_chat_history ADD CONSTRAINT user_chat_history_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;",
         "ALTER TABLE video_analysis_output DROP CONSTRAINT IF EXISTS video_analysis_output_user_id_fkey;",
-        "ALTER TABLE video_analysis_output ADD CONSTRAINT video_analysis_output_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;"
+        "ALTER TABLE video_analysis_output ADD CONSTRAINT video_analysis_output_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;",
+        "ALTER TABLE video_analysis_output ADD COLUMN IF NOT EXISTS content_hash text, ADD COLUMN IF NOT EXISTS prompt_hash text, ADD COLUMN IF NOT EXISTS processing_seconds real;",
+        "CREATE INDEX IF NOT EXISTS video_analysis_output_content_prompt_idx ON video_analysis_output (content_hash, prompt_hash, \"TIMESTAMP\" DESC);",
+        "ALTER TABLE video_analysis_output ADD COLUMN IF NOT EXISTS summary text, ADD COLUMN IF NOT EXISTS overall_score smallint CHECK (overall_score BETWEEN 1 AND 10), ADD COLUMN IF NOT EXISTS scores jsonb, ADD COLUMN IF NOT EXISTS target_audience text, ADD COLUMN IF NOT EXISTS key_messages jsonb, ADD COLUMN IF NOT EXISTS strengths jsonb, ADD COLUMN IF NOT EXISTS recommendations jsonb;",
+        "CREATE INDEX IF NOT EXISTS video_analysis_output_user_timestamp_idx ON video_analysis_output (user_id, \"TIMESTAMP\" DESC);",
+        "CREATE INDEX IF NOT EXISTS video_analysis_output_overall_score_idx ON video_analysis_output (overall_score);",
+        "UPDATE video_analysis_output SET summary = left(regexp_replace(split_part(analysis, E'\\n\\n', 1), '\\s+', ' ', 'g'), 280) WHERE summary IS NULL AND analysis IS NOT NULL;",
+        "ALTER TABLE video_analysis_output ADD COLUMN IF NOT EXISTS deduplicated boolean NOT NULL DEFAULT false;",
+        "UPDATE video_analysis_output SET deduplicated = true WHERE processing_seconds = 0;"
     ]
 
     for sql in schema_updates:
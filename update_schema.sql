@@ -20,3 +20,40 @@ ALTER TABLE video_analysis_output
 DROP CONSTRAINT IF EXISTS video_analysis_output_user_id_fkey,
 ADD CONSTRAINT video_analysis_output_user_id_fkey
 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+
+-- Content-addressed lookup of earlier video analyses
+ALTER TABLE video_analysis_output
+ADD COLUMN IF NOT EXISTS content_hash text,
+ADD COLUMN IF NOT EXISTS prompt_hash text,
+ADD COLUMN IF NOT EXISTS processing_seconds real;
+
+CREATE INDEX IF NOT EXISTS video_analysis_output_content_prompt_idx
+ON video_analysis_output (content_hash, prompt_hash, "TIMESTAMP" DESC);
+
+-- Typed fields of structured video analyses; the history list reads these instead of the full text
+ALTER TABLE video_analysis_output
+ADD COLUMN IF NOT EXISTS summary text,
+ADD COLUMN IF NOT EXISTS overall_score smallint CHECK (overall_score BETWEEN 1 AND 10),
+ADD COLUMN IF NOT EXISTS scores jsonb,
+ADD COLUMN IF NOT EXISTS target_audience text,
+ADD COLUMN IF NOT EXISTS key_messages jsonb,
+ADD COLUMN IF NOT EXISTS strengths jsonb,
+ADD COLUMN IF NOT EXISTS recommendations jsonb;
+
+CREATE INDEX IF NOT EXISTS video_analysis_output_user_timestamp_idx
+ON video_analysis_output (user_id, "TIMESTAMP" DESC);
+
+CREATE INDEX IF NOT EXISTS video_analysis_output_overall_score_idx
+ON video_analysis_output (overall_score);
+
+-- Earlier text-only analyses get a summary from their first paragraph
+UPDATE video_analysis_output
+SET summary = left(regexp_replace(split_part(analysis, E'\n\n', 1), '\s+', ' ', 'g'), 280)
+WHERE summary IS NULL AND analysis IS NOT NULL;
+
+-- Rows copied from an earlier analysis of the same video and prompt
+ALTER TABLE video_analysis_output
+ADD COLUMN IF NOT EXISTS deduplicated boolean NOT NULL DEFAULT false;
+
+-- Copies used to be stored with a zero processing time
+UPDATE video_analysis_output SET deduplicated = true WHERE processing_seconds = 0;
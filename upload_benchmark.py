@@ -0,0 +1,83 @@
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from starlette.requests import Request
+from uploads import save_upload, save_stream
+
+# Compares the multipart /send_message path with the raw /videos path, in process and without the network:
+# the same body is fed through Starlette's request handling in 64 KB pieces, as an ASGI server would.
+
+BOUNDARY = "benchmarkboundary"
+PIECE_SIZE = 64 * 1024
+
+def make_receive(pieces):
+    pieces = iter(pieces)
+
+    async def receive():
+        piece = next(pieces, None)
+        if piece is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": piece, "more_body": True}
+
+    return receive
+
+def video_pieces(size):
+    block = os.urandom(PIECE_SIZE)
+    for offset in range(0, size, PIECE_SIZE):
+        yield block[:min(PIECE_SIZE, size - offset)]
+
+def multipart_pieces(size):
+    yield (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"message\"\r\n\r\n\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"video\"; filename=\"ad.mp4\"\r\n"
+        "Content-Type: video/mp4\r\n\r\n"
+    ).encode()
+    yield from video_pieces(size)
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+def make_request(content_type, pieces):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [(b"content-type", content_type.encode())],
+    }
+    return Request(scope, make_receive(pieces))
+
+async def multipart_upload(size, path):
+    request = make_request(f"multipart/form-data; boundary={BOUNDARY}", multipart_pieces(size))
+    form = await request.form()
+    try:
+        return await save_upload(form["video"], path)
+    finally:
+        await form.close()
+
+async def raw_upload(size, path):
+    request = make_request("application/octet-stream", video_pieces(size))
+    return await save_stream(request.stream(), path)
+
+async def measure(name, upload, size, directory):
+    path = os.path.join(directory, name)
+    wall, cpu = time.perf_counter(), time.process_time()
+    stored, _ = await upload(size, path)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    os.remove(path)
+    assert stored == size
+    gigabytes = size / 1024 ** 3
+    print(f"{name:>10}: {size / 1024 ** 2 / wall:8.1f} MB/s, {cpu / gigabytes:6.2f} CPU s/GB, {wall:6.2f}s wall")
+
+async def main(args):
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for _ in range(args.rounds):
+            await measure("multipart", multipart_upload, size, directory)
+            await measure("raw", raw_upload, size, directory)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and CPU per GB of the multipart and raw upload paths")
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--dir", default=None, help="Directory to write to (defaults to the system temp dir)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+import logging
+import mimetypes
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Forward uploads to Gemini while they are still arriving
+PIPELINED_UPLOADS = os.getenv("PIPELINED_UPLOADS", "true").lower() in ("1", "true", "yes")
+
+# Smaller uploads gain little from pipelining and go through the regular upload (bytes)
+PIPELINED_UPLOAD_MIN_SIZE = int(os.getenv("PIPELINED_UPLOAD_MIN_SIZE", str(32 * 1024 * 1024)))
+
+# Bytes per forwarded request; the Files API wants multiples of 256 KiB
+GEMINI_UPLOAD_CHUNK_SIZE = int(os.getenv("GEMINI_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Most bytes held in memory waiting to be forwarded; the client upload slows down beyond this
+PIPELINED_UPLOAD_MAX_BUFFER = int(os.getenv("PIPELINED_UPLOAD_MAX_BUFFER", str(64 * 1024 * 1024)))
+
+def upload_mime_type(content_type, file_name):
+    if content_type and content_type.startswith("video/"):
+        return content_type
+    return mimetypes.guess_type(file_name or "")[0] or "video/mp4"
+
+def should_pipeline(size):
+    return PIPELINED_UPLOADS and size is not None and size >= PIPELINED_UPLOAD_MIN_SIZE
+
+class UploadPipeline:
+    # Forwards bytes the caller has stored to a resumable Gemini upload from a background task.
+    # tee() wraps one incoming stream; a resumable upload feeds its chunk requests through feed()/end().
+    # If forwarding fails the spooled copy is uploaded the regular way later.
+    def __init__(self, backend, size, mime_type, display_name, resilience=None,
+                 chunk_size=GEMINI_UPLOAD_CHUNK_SIZE, max_buffer=PIPELINED_UPLOAD_MAX_BUFFER):
+        self.backend = backend
+        self.size = size
+        self.mime_type = mime_type
+        self.display_name = display_name
+        self.resilience = resilience
+        self.chunk_size = chunk_size
+        # Bytes fed so far, forwarded or still buffered
+        self.received = 0
+        self._queue = asyncio.Queue(maxsize=max(1, max_buffer // chunk_size))
+        self._buffer = bytearray()
+        self._task = None
+        self._error = None
+        self._file = None
+        self._received_at = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._forward())
+
+    async def feed(self, chunk):
+        # Waits while the forwarder is a full buffer behind, which slows the client down
+        self.received += len(chunk)
+        if self._error is not None:
+            return
+        self._buffer += chunk
+        while len(self._buffer) >= self.chunk_size:
+            await self._queue.put(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+
+    async def end(self):
+        if self._buffer and self._error is None:
+            await self._queue.put(bytes(self._buffer))
+            self._buffer.clear()
+        self._received_at = time.monotonic()
+        await self._queue.put(None)
+
+    async def tee(self, chunks):
+        # Every chunk still goes to the caller (the disk spool) before it is forwarded
+        self.start()
+        try:
+            async for chunk in chunks:
+                yield chunk
+                await self.feed(chunk)
+            await self.end()
+        except BaseException:
+            self.cancel()
+            raise
+
+    async def _forward(self):
+        session = None
+        offset = 0
+        try:
+            while True:
+                block = await self._queue.get()
+                if block is None:
+                    break
+                if self._error is not None:
+                    # Keep draining so the client upload never waits on a dead pipeline
+                    continue
+                try:
+                    if session is None:
+                        # Opened on the first chunk, while the rest is still in flight
+                        session = await self._call(lambda: self.backend.start_upload(self.size, self.mime_type, self.display_name))
+                    final = offset + len(block) == self.size
+                    result = await self._call(lambda: session.send(block, offset, final))
+                    offset += len(block)
+                    if final:
+                        self._file = result
+                except Exception as e:
+                    self._error = e
+                    logger.warning(f"Pipelined Gemini upload failed at byte {offset}, falling back to a regular upload: {str(e)}")
+            if self._error is None and self._file is None:
+                self._error = ValueError(f"Upload ended at byte {offset} of {self.size}")
+                logger.warning(f"Pipelined Gemini upload incomplete, falling back to a regular upload: {str(self._error)}")
+        finally:
+            if session is not None:
+                await session.close()
+
+    async def _call(self, func):
+        return await (self.resilience.call(func) if self.resilience is not None else func())
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def result(self):
+        # The uploaded Gemini file, or None if forwarding failed
+        if self._task is None:
+            return None
+        await self._task
+        if self._error is not None or self._file is None:
+            return None
+        logger.info(
+            f"Pipelined Gemini upload of {self.size} bytes finished "
+            f"{time.monotonic() - self._received_at:.2f}s after the last byte arrived"
+        )
+        try:
+            return await self._call(lambda: asyncio.to_thread(self.backend.get_file, self._file["name"]))
+        except Exception as e:
+            logger.warning(f"Pipelined Gemini upload finished but its file can't be read, falling back to a regular upload: {str(e)}")
+            return None
@@ -0,0 +1,97 @@
+import os
+import asyncio
+import hashlib
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Uploads are copied to disk this many bytes at a time
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Largest video accepted (bytes)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(2 * 1024 * 1024 * 1024)))
+
+# Leading bytes handed to a save_stream head check
+HEAD_CHECK_SIZE = 4096
+
+class UploadRejected(Exception):
+    status_code = 400
+
+class UploadTooLarge(UploadRejected):
+    status_code = 413
+
+    def __init__(self, max_size):
+        super().__init__(f"Video exceeds the maximum upload size of {max_size // (1024 * 1024)} MB")
+
+class UnsupportedMediaType(UploadRejected):
+    status_code = 415
+
+class LengthRequired(UploadRejected):
+    status_code = 411
+
+def check_declared_size(content_length, max_size=MAX_UPLOAD_SIZE, required=False):
+    # Reject an oversized request from its headers before reading the body; `required` also rejects one without a size
+    try:
+        size = int(content_length) if content_length is not None else None
+    except ValueError:
+        size = None
+    if size is None:
+        if required:
+            raise LengthRequired("Uploads must declare their size in a Content-Length header")
+        return
+    if size > max_size:
+        raise UploadTooLarge(max_size)
+
+def check_content_type(content_type):
+    if content_type and not content_type.startswith("video/") and content_type != "application/octet-stream":
+        raise UnsupportedMediaType(f"Expected a video upload, got {content_type}")
+
+async def upload_chunks(upload, chunk_size=UPLOAD_CHUNK_SIZE):
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+async def save_upload(upload, path, max_size=MAX_UPLOAD_SIZE, chunk_size=UPLOAD_CHUNK_SIZE, check_head=None):
+    # Copies an UploadFile to `path`; see save_stream
+    check_content_type(upload.content_type)
+    return await save_stream(upload_chunks(upload, chunk_size), path, max_size, chunk_size, check_head)
+
+async def save_stream(chunks, path, max_size=MAX_UPLOAD_SIZE, chunk_size=UPLOAD_CHUNK_SIZE, check_head=None):
+    # Writes an async iterable of byte chunks to `path`, hashing and size-checking on the way.
+    # Small chunks (e.g. a raw request body) are coalesced into writes of about `chunk_size`.
+    # `check_head` sees the first HEAD_CHECK_SIZE bytes as soon as they arrive and may raise to reject the upload.
+    # Returns (size, sha256 hex digest); the partial file is removed if the upload is rejected.
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    out = await asyncio.to_thread(open, path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(max_size)
+            digest.update(chunk)
+            buffer += chunk
+            if check_head is not None and size >= HEAD_CHECK_SIZE:
+                check_head(bytes(buffer[:HEAD_CHECK_SIZE]))
+                check_head = None
+            if len(buffer) >= chunk_size:
+                await asyncio.to_thread(out.write, bytes(buffer))
+                buffer.clear()
+        if size == 0:
+            raise UploadRejected("The uploaded video is empty")
+        if check_head is not None:
+            check_head(bytes(buffer))
+        if buffer:
+            await asyncio.to_thread(out.write, bytes(buffer))
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(os.remove, path)
+        raise
+    await asyncio.to_thread(out.close)
+    logger.info(f"Stored upload {path} ({size} bytes)")
+    return size, digest.hexdigest()
@@ -0,0 +1,92 @@
+import os
+import logging
+from collections import OrderedDict, defaultdict, deque
+from history_manager import estimate_tokens, content_text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per-user totals are kept for this many most recently active users
+USAGE_MAX_USERS = int(os.getenv("USAGE_MAX_USERS", "1000"))
+
+# How many of the most expensive users /metrics lists
+USAGE_TOP_USERS = int(os.getenv("USAGE_TOP_USERS", "10"))
+
+USAGE_FIELDS = ("prompt_tokens", "output_tokens", "cached_tokens", "total_tokens")
+
+def estimate_prompt_tokens(message, history=()):
+    # Pre-flight estimate of what a request will send, before Gemini reports the real count
+    return estimate_tokens(message) + sum(estimate_tokens(content_text(turn)) for turn in history)
+
+def usage_from(metadata):
+    # Normalize Gemini's usage_metadata; None when the response carried none
+    if metadata is None:
+        return None
+    prompt_tokens = getattr(metadata, "prompt_token_count", 0) or 0
+    output_tokens = getattr(metadata, "candidates_token_count", 0) or 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "cached_tokens": getattr(metadata, "cached_content_token_count", 0) or 0,
+        "total_tokens": getattr(metadata, "total_token_count", 0) or prompt_tokens + output_tokens,
+    }
+
+def new_totals():
+    return {"requests": 0, "estimated_prompt_tokens": 0, **{field: 0 for field in USAGE_FIELDS}}
+
+class UsageTracker:
+    def __init__(self, max_users=USAGE_MAX_USERS, top_users=USAGE_TOP_USERS):
+        self.max_users = max_users
+        self.top_users = top_users
+        self._routes = defaultdict(new_totals)
+        self._users = OrderedDict()
+        self._samples = defaultdict(lambda: deque(maxlen=1000))
+
+    def record(self, user_id, route, usage, estimated=0, seconds=None):
+        if usage is None:
+            logger.warning(f"No usage metadata for user={user_id} route={route}")
+            return
+        logger.info(
+            f"Usage user={user_id} route={route} prompt_tokens={usage['prompt_tokens']} "
+            f"(estimated {estimated}) output_tokens={usage['output_tokens']} cached_tokens={usage['cached_tokens']}"
+            + (f" latency={seconds:.2f}s" if seconds is not None else "")
+        )
+        key = str(user_id)
+        if key not in self._users:
+            self._users[key] = new_totals()
+        self._users.move_to_end(key)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+        for totals in (self._routes[route], self._users[key]):
+            totals["requests"] += 1
+            totals["estimated_prompt_tokens"] += estimated
+            for field in USAGE_FIELDS:
+                totals[field] += usage[field]
+        if seconds is not None and usage["output_tokens"]:
+            self._samples[route].append((usage["prompt_tokens"], usage["output_tokens"], seconds))
+
+    def metrics(self):
+        def summarize(totals, samples=()):
+            requests = totals["requests"] or 1
+            summary = {
+                **totals,
+                "avg_prompt_tokens": round(totals["prompt_tokens"] / requests),
+                "avg_output_tokens": round(totals["output_tokens"] / requests),
+            }
+            if totals["estimated_prompt_tokens"]:
+                # How far the pre-flight estimate is off; tune the estimator if this drifts from 1
+                summary["estimate_ratio"] = round(totals["prompt_tokens"] / totals["estimated_prompt_tokens"], 2)
+            if samples:
+                summary["seconds_per_1k_output_tokens"] = round(
+                    1000 * sum(s for _, _, s in samples) / sum(o for _, o, _ in samples), 2
+                )
+            return summary
+
+        expensive = sorted(self._users.items(), key=lambda item: item[1]["total_tokens"], reverse=True)
+        return {
+            "routes": {route: summarize(totals, self._samples[route]) for route, totals in self._routes.items()},
+            "top_users": {user_id: summarize(totals) for user_id, totals in expensive[:self.top_users]},
+            "tracked_users": len(self._users),
+        }
@@ -0,0 +1,60 @@
+import hashlib
+import asyncio
+import logging
+from redis_config import get_redis_client
+from response_cache import normalize_prompt
+from database import find_video_analysis
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def prompt_hash(prompt, deep, model_name, mode=None):
+    # Results are reusable only for the same instructions on the same model, in the same report mode
+    key = f"{model_name}:{deep}:{normalize_prompt(prompt)}"
+    if mode:
+        key = f"{mode}:{key}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+class VideoIndex:
+    # Looks up finished analyses in video_analysis_output by content and prompt hash
+    def __init__(self, prefix="video_dedupe"):
+        self.prefix = prefix
+
+    async def lookup(self, content_hash, prompt_hash):
+        row = await find_video_analysis(content_hash, prompt_hash)
+        await self._count("hits" if row else "misses")
+        if row:
+            logger.info(f"Serving stored analysis of video {content_hash[:12]} instead of re-analyzing")
+        return row
+
+    async def saved(self, row):
+        # A hit served without touching Gemini saved the whole processing time of the stored analysis
+        if not row.get("processing_seconds"):
+            return
+        try:
+            await asyncio.to_thread(
+                get_redis_client().hincrbyfloat, f"{self.prefix}:stats", "saved_seconds", row["processing_seconds"]
+            )
+        except Exception as e:
+            logger.error(f"Error updating video dedupe stats: {str(e)}")
+
+    async def _count(self, outcome):
+        try:
+            await asyncio.to_thread(get_redis_client().hincrby, f"{self.prefix}:stats", outcome, 1)
+        except Exception as e:
+            logger.error(f"Error updating video dedupe stats: {str(e)}")
+
+    async def stats(self):
+        redis_client = get_redis_client()
+        try:
+            raw = await asyncio.to_thread(redis_client.hgetall, f"{self.prefix}:stats")
+        except Exception as e:
+            logger.error(f"Error reading video dedupe stats: {str(e)}")
+            raw = {}
+        stats = {field.decode(): float(value) for field, value in raw.items()}
+        return {
+            "hits": int(stats.get("hits", 0)),
+            "misses": int(stats.get("misses", 0)),
+            "saved_processing_seconds": round(stats.get("saved_seconds", 0.0), 1),
+        }
@@ -0,0 +1,252 @@
+import os
+import struct
+import logging
+from uploads import UploadRejected, UnsupportedMediaType
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Longest video accepted for analysis (seconds)
+VIDEO_MAX_DURATION = float(os.getenv("VIDEO_MAX_DURATION", "3600"))
+
+# Bytes of the file start read when the container keeps its metadata up front (Matroska/WebM)
+PROBE_HEAD_SIZE = 1024 * 1024
+
+# Enough leading bytes to recognize any supported container (MPEG-TS needs its second sync byte)
+SNIFF_SIZE = 189
+
+class VideoTooLong(UploadRejected):
+    status_code = 422
+
+class CorruptBox(ValueError):
+    pass
+
+# Containers Gemini accepts, by signature
+def container_of(head):
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return "mov"
+        return "3gp" if brand.startswith(b"3g") else "mp4"
+    if head[4:8] in (b"moov", b"mdat", b"wide", b"free", b"skip"):
+        # Old QuickTime files start without an ftyp box
+        return "mov"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm"
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return "avi"
+    if head.startswith(b"FLV"):
+        return "flv"
+    if head.startswith(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"):
+        return "wmv"
+    if head.startswith(b"\x00\x00\x01\xba") or head.startswith(b"\x00\x00\x01\xb3"):
+        return "mpeg"
+    if head[:1] == b"\x47" and head[188:189] == b"\x47":
+        return "mpegts"
+    return None
+
+def describe(head):
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "a GIF"
+    if head.startswith(b"\x89PNG") or head.startswith(b"\xff\xd8\xff"):
+        return "an image"
+    return "not a supported video format"
+
+def sniff(head):
+    # Rejects obviously wrong input from its first bytes, before the rest is read
+    container = container_of(head)
+    if container is None:
+        raise UnsupportedMediaType(f"The uploaded file is {describe(head)}")
+    return container
+
+# Smallest payloads holding the fields read below (full box header included)
+MVHD_MIN_SIZE = {0: 20, 1: 32}
+TKHD_MIN_SIZE = {0: 84, 1: 96}
+HDLR_MIN_SIZE = 12
+STSD_MIN_SIZE = 16
+
+def iter_boxes(f, start, end):
+    # Yields (type, payload offset, payload size) for ISO BMFF boxes between start and end
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            # A box running past its parent (or the file) means the file is truncated or corrupt
+            raise CorruptBox(f"{box_type.decode('latin-1')} box at byte {offset} is truncated")
+        yield box_type, offset + header_size, size - header_size
+        offset += size
+
+def find_box(f, start, end, box_type):
+    for found, payload, size in iter_boxes(f, start, end):
+        if found == box_type:
+            return payload, size
+    return None
+
+def probe_iso_bmff(f, file_size):
+    # Walks the top-level boxes by seeking, so the moov box is found at the start or the end of the file
+    info = {}
+    moov = find_box(f, 0, file_size, b"moov")
+    if moov is None:
+        raise CorruptBox("no movie header found")
+    moov_start, moov_size = moov
+    moov_end = moov_start + moov_size
+
+    mvhd = find_box(f, moov_start, moov_end, b"mvhd")
+    if mvhd:
+        f.seek(mvhd[0])
+        data = f.read(min(mvhd[1], 32))
+        if not data or len(data) < MVHD_MIN_SIZE.get(data[0], len(data) + 1):
+            raise CorruptBox("movie header is truncated")
+        if data[0] == 1:
+            timescale, duration = struct.unpack(">IQ", data[20:32])
+        else:
+            timescale, duration = struct.unpack(">II", data[12:20])
+        if timescale:
+            info["duration"] = duration / timescale
+
+    for box_type, trak_start, trak_size in iter_boxes(f, moov_start, moov_end):
+        if box_type != b"trak":
+            continue
+        trak_end = trak_start + trak_size
+        mdia = find_box(f, trak_start, trak_end, b"mdia")
+        if mdia is None:
+            continue
+        hdlr = find_box(f, mdia[0], mdia[0] + mdia[1], b"hdlr")
+        if hdlr is None or hdlr[1] < HDLR_MIN_SIZE:
+            continue
+        f.seek(hdlr[0] + 8)
+        if f.read(4) != b"vide":
+            continue
+        tkhd = find_box(f, trak_start, trak_end, b"tkhd")
+        if tkhd:
+            f.seek(tkhd[0])
+            version = f.read(1)
+            if not version or tkhd[1] < TKHD_MIN_SIZE.get(version[0], tkhd[1] + 1):
+                raise CorruptBox("track header is truncated")
+            # Width and height are the last two 16.16 fixed-point fields
+            f.seek(tkhd[0] + tkhd[1] - 8)
+            width, height = struct.unpack(">II", f.read(8))
+            info["width"], info["height"] = width >> 16, height >> 16
+        minf = find_box(f, mdia[0], mdia[0] + mdia[1], b"minf")
+        stbl = minf and find_box(f, minf[0], minf[0] + minf[1], b"stbl")
+        stsd = stbl and find_box(f, stbl[0], stbl[0] + stbl[1], b"stsd")
+        if stsd and stsd[1] >= STSD_MIN_SIZE:
+            # Full box header and entry count, then the first sample entry's size and codec
+            f.seek(stsd[0] + 12)
+            info["codec"] = f.read(4).decode("latin-1").strip()
+        break
+    return info
+
+def read_ebml_id(data, pos):
+    first = data[pos]
+    length = 1
+    while length <= 4 and not first & (0x80 >> (length - 1)):
+        length += 1
+    return int.from_bytes(data[pos:pos + length], "big"), pos + length
+
+def read_ebml_size(data, pos):
+    first = data[pos]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    value = first & ((0x80 >> (length - 1)) - 1)
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    unknown = value == (1 << (7 * length)) - 1
+    return (None if unknown else value), pos + length
+
+EBML_SEGMENT, EBML_INFO, EBML_TRACKS, EBML_TRACK_ENTRY, EBML_VIDEO = 0x18538067, 0x1549A966, 0x1654AE6B, 0xAE, 0xE0
+EBML_TIMECODE_SCALE, EBML_DURATION, EBML_CODEC_ID, EBML_TRACK_TYPE = 0x2AD7B1, 0x4489, 0x86, 0x83
+EBML_PIXEL_WIDTH, EBML_PIXEL_HEIGHT = 0xB0, 0xBA
+EBML_CONTAINERS = {EBML_SEGMENT, EBML_INFO, EBML_TRACKS, EBML_TRACK_ENTRY, EBML_VIDEO}
+
+def probe_matroska(head):
+    # Info and Tracks sit near the start of WebM/Matroska files
+    values = {}
+    track = {}
+    timecode_scale = 1000000
+    pos = 0
+    try:
+        # Skip the EBML header element
+        _, pos = read_ebml_id(head, 0)
+        size, pos = read_ebml_size(head, pos)
+        pos += size or 0
+        while pos < len(head) - 8:
+            element, pos = read_ebml_id(head, pos)
+            size, pos = read_ebml_size(head, pos)
+            if element in EBML_CONTAINERS or size is None:
+                if element == EBML_TRACK_ENTRY:
+                    if track.get("type") == 1:
+                        break
+                    track = {}
+                continue
+            data = head[pos:pos + size]
+            if element == EBML_TIMECODE_SCALE:
+                timecode_scale = int.from_bytes(data, "big")
+            elif element == EBML_DURATION:
+                values["duration"] = struct.unpack(">f" if size == 4 else ">d", data)[0]
+            elif element == EBML_TRACK_TYPE:
+                track["type"] = int.from_bytes(data, "big")
+            elif element == EBML_CODEC_ID:
+                track["codec"] = data.decode("latin-1")
+            elif element == EBML_PIXEL_WIDTH:
+                track["width"] = int.from_bytes(data, "big")
+            elif element == EBML_PIXEL_HEIGHT:
+                track["height"] = int.from_bytes(data, "big")
+            pos += size
+    except (IndexError, struct.error):
+        pass
+    info = {}
+    if "duration" in values:
+        info["duration"] = values["duration"] * timecode_scale / 1e9
+    if track.get("type") == 1:
+        info.update({key: track[key] for key in ("codec", "width", "height") if key in track})
+    return info
+
+def probe_video(path, max_duration=VIDEO_MAX_DURATION):
+    # Reads container headers only; returns {"container", "duration", "codec", "width", "height"} as found
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(PROBE_HEAD_SIZE)
+        container = sniff(head[:SNIFF_SIZE])
+        info = {"container": container}
+        try:
+            if container in ("mp4", "mov", "3gp"):
+                info.update(probe_iso_bmff(f, file_size))
+            elif container == "webm":
+                info.update(probe_matroska(head))
+        except CorruptBox as e:
+            raise UploadRejected(f"The video is corrupt or incomplete: {str(e)}") from e
+        except (IndexError, ValueError, struct.error) as e:
+            raise UploadRejected("The video is corrupt or incomplete") from e
+    if info.get("duration") is not None and info["duration"] > max_duration:
+        raise VideoTooLong(
+            f"The video is {info['duration'] / 60:.0f} minutes long; the limit is {max_duration / 60:.0f} minutes"
+        )
+    logger.info(f"Probed {path}: {info}")
+    return info
+
+def video_duration(info):
+    return f"{info['duration']:.1f}" if info.get("duration") is not None else None
+
+def video_format(info):
+    # e.g. "mp4/avc1 1920x1080"
+    text = info["container"]
+    if info.get("codec"):
+        text += f"/{info['codec']}"
+    if info.get("width") and info.get("height"):
+        text += f" {info['width']}x{info['height']}"
+    return text